@@ -43,7 +43,15 @@ const eegDataSchema = new mongoose.Schema({
     acquisition: String,
     channels: Number,
     sampleRate: Number,
-    duration: Number
+    duration: Number,
+    // Layout of raw array uploads (.npy), which carry no header of their own
+    channelNames: [String],
+    channelTypes: [String],
+    units: [String],
+    layout: {
+      type: String,
+      enum: ['channels_first', 'times_first']
+    }
   },
   bidsCompliant: {
     type: Boolean,
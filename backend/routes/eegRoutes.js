@@ -9,6 +9,40 @@ const { handleEEGUpload, cleanupOnError } = require('../middleware/upload');
 const EEGData = require('../models/EEGData');
 const { processEEGFile, extractMetadata } = require('../services/eegProcessing');
 
+// Parse a form field holding a list: repeated fields, a JSON array or comma-separated text
+const parseList = (value) => {
+  if (value === undefined || value === null || value === '') {
+    return undefined;
+  }
+  if (Array.isArray(value)) {
+    return value.map(item => String(item).trim());
+  }
+  const text = String(value).trim();
+  if (text.startsWith('[')) {
+    return JSON.parse(text).map(item => String(item).trim());
+  }
+  return text.split(',').map(item => item.trim()).filter(item => item);
+};
+
+// Layout metadata for raw array uploads, which have no header to read it from.
+// Form fields: sampleRate (Hz), channelNames, channelTypes (MNE types, one or
+// per channel), units (V, mV, uV or nV, one or per channel) and layout
+// ("channels_first" or "times_first").
+const arrayMetadata = (body, format) => {
+  if (format !== 'npy') {
+    return {};
+  }
+  const sampleRate = parseFloat(body.sampleRate);
+  return {
+    // The size-based estimate means nothing for a raw array
+    sampleRate: sampleRate > 0 ? sampleRate : null,
+    channelNames: parseList(body.channelNames),
+    channelTypes: parseList(body.channelTypes),
+    units: parseList(body.units),
+    layout: body.layout || undefined
+  };
+};
+
 // @route   POST /api/eeg/upload
 // @desc    Upload a new EEG file
 // @access  Private
@@ -20,21 +54,32 @@ router.post('/upload', [auth, cleanupOnError, handleEEGUpload], async (req, res)
     
     // Extract metadata from the file
     const fileMetadata = await extractMetadata(req.file.path);
+    const format = path.extname(req.file.originalname).substring(1).toLowerCase();
+    
+    let layoutMetadata;
+    try {
+      layoutMetadata = arrayMetadata(req.body, format);
+    } catch (err) {
+      fs.unlinkSync(req.file.path);
+      return res.status(400).json({ message: 'Invalid array metadata: ' + err.message });
+    }
     
     // Create new EEG data record
     const eegData = new EEGData({
       userId: req.user.id,
       filename: req.file.filename,
       originalFilename: req.file.originalname,
-      format: path.extname(req.file.originalname).substring(1).toLowerCase(),
+      format: format,
       size: req.file.size,
       metadata: {
         ...fileMetadata,
+        ...layoutMetadata,
         subject: {
           id: req.body.subjectId || 'unknown',
           age: req.body.subjectAge || null,
           gender: req.body.subjectGender || 'unknown',
-          group: req.body.subjectGroup || 'control'
+          // Left empty rather than defaulted: the group is used as a training label
+          group: req.body.subjectGroup || null
         },
         session: req.body.session || 'unknown',
         task: req.body.task || 'unknown'
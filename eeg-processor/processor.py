@@ -1,19 +1,20 @@
 # processor.py - Main EEG processing service
 import os
+import json
 import time
 import logging
+import threading
 from datetime import datetime
 from dotenv import load_dotenv
-import pymongo
-import gridfs
-import numpy as np
 from bson.objectid import ObjectId
-from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-import mne
-from utils.eeg_loader import load_eeg_file
-from utils.feature_extraction import extract_features_for_adhd
-from utils.preprocessing import preprocess_eeg
+from utils import health
+from utils.pipeline import EEGPipeline
+from utils.startup import StartupProfile
+
+# numpy, scipy, mne, sklearn and pandas are imported lazily: pipeline workers
+# re-import this module on spawn, and the healthcheck must stay cheap. The
+# warm-up phase in main() pays the import cost before the service reports ready.
 
 # Configure logging
 logging.basicConfig(
@@ -34,6 +35,9 @@ class MongoDBConnection:
         
     def connect(self):
         try:
+            import pymongo
+            import gridfs
+            
             mongodb_uri = os.getenv('MONGODB_URI')
             self.client = pymongo.MongoClient(mongodb_uri)
             self.db = self.client.get_default_database()
@@ -49,130 +53,672 @@ class MongoDBConnection:
             self.client.close()
             logger.info("MongoDB connection closed")
 
+# CPU stage: runs in a pipeline worker process, so it must stay module-level
+def analyze_eeg_record(payload):
+    """Load, preprocess and classify one recording fetched from MongoDB"""
+    from utils.eeg_loader import load_eeg_file
+    from utils.feature_extraction import extract_features_for_adhd
+    from utils.preprocessing import preprocess_eeg
+    from utils.feature_schema import DEFAULT_SCHEMA as schema, standard_channel_names
+    
+    eeg_id = payload['eeg_id']
+    
+    # Save to temporary file
+    temp_file_path = os.path.join(payload['data_dir'], f"temp_{eeg_id}.{payload['format'].lower()}")
+    with open(temp_file_path, 'wb') as temp_file:
+        temp_file.write(payload['data'])
+    
+    # Array formats carry their sampling rate and channels in a JSON sidecar
+    sidecar_path = None
+    if payload.get('sidecar'):
+        sidecar_path = os.path.splitext(temp_file_path)[0] + '.json'
+        with open(sidecar_path, 'w') as sidecar_file:
+            json.dump(payload['sidecar'], sidecar_file)
+    
+    try:
+        # Load EEG file
+        raw = load_eeg_file(temp_file_path)
+        
+        # Per-channel and regional features are keyed by standard 10-20 names
+        renames = standard_channel_names(raw.ch_names)
+        if renames:
+            raw.rename_channels(renames)
+        
+        # Preprocess the EEG data
+        preprocessed = preprocess_eeg(raw)
+        
+        # Extract features for ADHD analysis
+        features = schema.vectorize(extract_features_for_adhd(preprocessed))
+        missing = schema.missing(features)
+        if missing:
+            logger.warning(f"EEG {eeg_id} is missing {len(missing)} of {len(schema)} features, e.g. {missing[:5]}")
+        
+        # Perform ADHD prediction
+        prediction, confidence, probabilities = predict_adhd(features)
+    finally:
+        # Clean up temporary files
+        os.remove(temp_file_path)
+        if sidecar_path:
+            os.remove(sidecar_path)
+    
+    return analysis_document(features, prediction, confidence, probabilities)
+
+def analysis_document(features, prediction, confidence, probabilities):
+    """Build the svm_analysis document stored for a recording"""
+    from utils.feature_schema import DEFAULT_SCHEMA as schema
+    
+    return {
+        "performed": True,
+        "result": prediction,
+        "confidence": confidence,
+        "features": schema.encode(features),
+        "missing_features": len(schema.missing(features)),
+        "performed_at": datetime.now(),
+        "details": {
+            "probabilities": probabilities,
+            "key_features": {
+                "theta_beta_ratio": schema.get(features, "global_theta_beta_ratio"),
+                "frontal_theta": schema.get(features, "frontal_theta"),
+                "central_beta": schema.get(features, "central_beta")
+            }
+        }
+    }
+
+# Model cache, keyed by the model file's modification time
+_model_cache = {"key": None, "model": None, "columns": None}
+
+def load_model():
+    """
+    Load the ADHD model once per process, reloading if the file changes
+
+    The compiled NumPy model (models/adhd_svm_model.npz) is preferred over the
+    pickled sklearn one unless the pickle is newer; set INFERENCE_BACKEND to "compiled" or "sklearn" to
+    force either, in which case a missing file raises instead of falling back
+    to the dummy prediction. Also resolves the model's input columns to feature vector
+    positions, so prediction is a single fancy-index into the vector.
+    """
+    from utils.inference import load_backend, model_path
+    
+    model_dir = os.path.join(os.path.dirname(__file__), 'models')
+    path = model_path(model_dir)
+    
+    # Check if model exists
+    if path is None:
+        return None
+    
+    key = (path, os.path.getmtime(path))
+    if _model_cache["key"] != key:
+        from utils.feature_schema import DEFAULT_SCHEMA as schema
+        
+        compiled_path = os.path.splitext(path)[0] + '.npz'
+        if path != compiled_path and os.path.exists(compiled_path) and os.getenv('INFERENCE_BACKEND', 'auto') == 'auto':
+            logger.warning(f"{path} is newer than {compiled_path}; using the pickled model until it is re-exported")
+        
+        model = load_backend(path)
+        # Models fitted on a DataFrame name their columns; otherwise assume schema order
+        if model.feature_names is not None:
+            _model_cache["columns"] = schema.column_indices(model.feature_names)
+        elif model.n_features in (None, len(schema)):
+            _model_cache["columns"] = None
+        else:
+            raise ValueError(f"Model expects {model.n_features} features, schema v{schema.version} has {len(schema)}")
+        _model_cache["model"] = model
+        _model_cache["key"] = key
+        logger.info(f"Loaded {type(model).__name__} model from {path}")
+    
+    return _model_cache["model"]
+
+def predict_adhd(features):
+    """
+    Use SVM model to predict ADHD from features
+
+    Parameters:
+    features (np.ndarray): float32 feature vector in DEFAULT_SCHEMA order
+    """
+    import numpy as np
+    from utils.feature_schema import DEFAULT_SCHEMA
+    
+    try:
+        model = load_model()
+        
+        if model is None:
+            logger.warning("ADHD model not found. Using dummy prediction.")
+            # Return dummy prediction (50/50 chance)
+            rand_val = np.random.random()
+            if rand_val > 0.5:
+                return "ADHD", 0.7, {"ADHD": 0.7, "non-ADHD": 0.3}
+            else:
+                return "non-ADHD", 0.65, {"ADHD": 0.35, "non-ADHD": 0.65}
+        
+        # Prepare feature vector in the model's column order
+        columns = _model_cache["columns"]
+        X = (features if columns is None else features[columns]).reshape(1, -1)
+        
+        # Missing features are NaN; the model cannot score the recording without them
+        missing = np.isnan(X[0])
+        if missing.any():
+            names = model.feature_names or DEFAULT_SCHEMA.names
+            raise ValueError(f"Recording is missing {int(missing.sum())} model features: "
+                             f"{[names[i] for i in np.flatnonzero(missing)][:10]}")
+        
+        # Make prediction
+        prediction = model.predict(X)[0]
+        probabilities = model.predict_proba(X)[0]
+        
+        # Get confidence (probability of the predicted class)
+        class_idx = np.where(model.classes_ == prediction)[0][0]
+        confidence = probabilities[class_idx]
+        
+        # Format probabilities as dictionary
+        prob_dict = {str(cls): float(prob) for cls, prob in zip(model.classes_, probabilities)}
+        
+        return str(prediction), float(confidence), prob_dict
+        
+    except Exception as e:
+        logger.error(f"Prediction error: {str(e)}")
+        return "Inconclusive", 0.0, {"ADHD": 0.0, "non-ADHD": 0.0, "Inconclusive": 1.0}
+
+def synthetic_recording(duration=10.0, sfreq=250.0):
+    """Build a short standard 10-20 recording of pink-ish noise for warm-up"""
+    import numpy as np
+    import mne
+    from utils.feature_schema import STANDARD_CHANNELS as ch_names
+    
+    rng = np.random.default_rng(0)
+    data = np.cumsum(rng.standard_normal((len(ch_names), int(duration * sfreq))), axis=1)
+    data = (data - data.mean(axis=1, keepdims=True)) * 1e-6
+    info = mne.create_info(ch_names=ch_names, sfreq=sfreq, ch_types=['eeg'] * len(ch_names))
+    return mne.io.RawArray(data, info, verbose=False)
+
+def warm_up_worker():
+    """
+    Import the pipeline dependencies, load the model and push a synthetic
+    recording through preprocessing, feature extraction and prediction
+    """
+    import numpy as np
+    from utils.feature_extraction import extract_features_for_adhd
+    from utils.preprocessing import preprocess_eeg
+    from utils.feature_schema import DEFAULT_SCHEMA as schema
+    
+    features = schema.vectorize(extract_features_for_adhd(preprocess_eeg(synthetic_recording())))
+    if np.isnan(features).all():
+        raise RuntimeError("Warm-up recording produced no features")
+    return predict_adhd(features)
+
+# Values the backend's upload route fills in when a field was left empty
+_METADATA_PLACEHOLDERS = {'', 'unknown'}
+
+def _known(value):
+    """Return value, or None if it is missing or a backend placeholder"""
+    if value is None or str(value).strip().lower() in _METADATA_PLACEHOLDERS:
+        return None
+    return value
+
 # EEG Processing Service
 class EEGProcessor:
     def __init__(self, mongo_connection):
         self.mongo = mongo_connection
         self.data_dir = os.getenv('DATA_DIR', '/app/data')
+        self.pipeline = None
+        self.feature_store_dir = os.getenv('FEATURE_STORE_DIR', os.path.join(self.data_dir, 'feature_store'))
+        # Created in warm_up(), after the startup import profile; the lock guards
+        # against the write, stream and file-watcher threads racing to create it
+        self.feature_store = None
+        self._feature_store_lock = threading.Lock()
+        # Store columns for recordings between fetch and write, keyed by EEG ID
+        self._store_columns = {}
+        # Live recordings being analysed incrementally, keyed by EEG ID
+        self.streams = {}
+        self.stream_publish_interval = float(os.getenv('STREAM_PUBLISH_INTERVAL', '10'))
+        self.stream_idle_timeout = float(os.getenv('STREAM_IDLE_TIMEOUT', '600'))
+        # Worker crashes a recording may be involved in before it is marked Inconclusive
+        self.max_attempts = int(os.getenv('PIPELINE_MAX_ATTEMPTS', '3'))
         
     def process_eeg_request(self, eeg_id):
         """Process an EEG analysis request"""
         try:
-            # Get EEG data from MongoDB
-            eeg_data = self.mongo.db.eegdata.find_one({"_id": ObjectId(eeg_id)})
+            payload = self._fetch_eeg(eeg_id)
             
-            if not eeg_data:
-                logger.error(f"EEG data not found: {eeg_id}")
+            if payload is None:
                 return False
             
-            # Extract binary data
-            binary_data = eeg_data['data']
+            analysis = analyze_eeg_record(payload)
             
-            # Save to temporary file
-            temp_file_path = os.path.join(self.data_dir, f"temp_{eeg_id}.{eeg_data['format'].lower()}")
-            with open(temp_file_path, 'wb') as temp_file:
-                temp_file.write(binary_data)
+            self._store_analysis(eeg_id, analysis)
+            self._append_to_feature_store(eeg_id, analysis)
             
-            # Load EEG file
-            raw = load_eeg_file(temp_file_path)
+            logger.info(f"Analysis completed for EEG {eeg_id}: {analysis['result']} (confidence: {analysis['confidence']:.2f})")
             
-            # Preprocess the EEG data
-            preprocessed = preprocess_eeg(raw)
-            
-            # Extract features for ADHD analysis
-            features = extract_features_for_adhd(preprocessed)
+        except Exception as e:
+            logger.error(f"Error processing EEG {eeg_id}: {str(e)}")
+            self._store_error(eeg_id, e)
+            return False
+        
+        # Outside the try: a store failure must not overwrite the stored analysis
+        self._flush_feature_store()
+        return True
+    
+    def process_batch(self, eeg_ids, suspects=()):
+        """
+        Process pending requests through the prefetch pipeline, overlapping
+        MongoDB reads and writes with feature extraction in worker processes
+
+        Recordings that were in flight when a worker died (suspects) are run
+        one at a time after the rest, so a recording that kills its worker
+        only takes itself down.
+
+        Parameters:
+        eeg_ids (list): EEG IDs to process
+        suspects (iterable): EEG IDs among them that were in flight when a worker died
+
+        Raises RuntimeError if a worker died during the batch; the pool is
+        replaced so the next run starts with fresh workers.
+        """
+        suspects = set(suspects)
+        runs = [[eeg_id for eeg_id in eeg_ids if eeg_id not in suspects]]
+        runs.extend([eeg_id] for eeg_id in eeg_ids if eeg_id in suspects)
+        
+        broken = False
+        for keys in runs:
+            if not keys:
+                continue
+            pipeline = self._get_pipeline()
+            try:
+                report = pipeline.run(keys)
+            finally:
+                if pipeline.broken:
+                    self.pipeline = None
+                    pipeline.shutdown()
+            broken = broken or pipeline.broken
+            logger.info(f"Pipeline run of {len(keys)} recordings finished in {report['wall_seconds']}s: "
+                        f"fetch {report['fetch']}, process {report['process']}, write {report['write']}")
+        
+        self._flush_feature_store()
+        if broken:
+            raise RuntimeError("A pipeline worker died during the batch; worker pool restarted")
+    
+    def process_stream_chunks(self, limit=100):
+        """
+        Consume pending chunks of live recordings from the eegchunks collection,
+        publishing provisional results as the recordings grow
+
+        Each recording is read separately from its next expected chunk, so a
+        stream stuck on a gap never holds up the others.
+
+        Parameters:
+        limit (int): Maximum chunks consumed per recording per call
+        """
+        pending = self.mongo.db.eegchunks.aggregate([
+            {"$group": {"_id": "$eeg_id", "first_seq": {"$min": "$seq"}, "oldest": {"$min": "$_id"}}}
+        ])
+        
+        for group in pending:
+            key = group["_id"]
+            eeg_id = str(key)
             
-            # Perform ADHD prediction
-            prediction, confidence, probabilities = self._predict_adhd(features)
+            # One bad recording must not stop the others from being read
+            try:
+                if eeg_id not in self.streams and group["first_seq"] != 0:
+                    # The header chunk may still be in flight, or was consumed before a restart
+                    age = time.time() - group["oldest"].generation_time.timestamp()
+                    if age > self.stream_idle_timeout:
+                        self._abandon_stream(eeg_id, key, "stream has no header chunk")
+                    continue
+                
+                self._consume_stream(eeg_id, key, limit)
+            except Exception as e:
+                logger.error(f"Error reading chunks of EEG {eeg_id}: {str(e)}")
+        
+        # Give up on recordings whose uploader went away without a final chunk
+        for eeg_id, stream in list(self.streams.items()):
+            if time.time() - stream["updated_at"] > self.stream_idle_timeout:
+                try:
+                    self._abandon_stream(eeg_id, stream["key"],
+                                         f"no new chunks after {stream['analyzer'].seconds:.0f}s of data")
+                except Exception as e:
+                    logger.error(f"Error abandoning stream of EEG {eeg_id}: {str(e)}")
+    
+    def _consume_stream(self, eeg_id, key, limit):
+        """Apply the contiguous run of chunks starting at the stream's next sequence number"""
+        from utils.streaming import StreamingBandPower, decode_chunk
+        
+        stream = self.streams.get(eeg_id)
+        next_seq = stream["next_seq"] if stream else 0
+        
+        # Chunks already applied (e.g. re-sent by the uploader) are dropped
+        if stream:
+            self.mongo.db.eegchunks.delete_many({"eeg_id": key, "seq": {"$lt": next_seq}})
+        
+        consumed = []
+        chunks = self.mongo.db.eegchunks.find(
+            {"eeg_id": key, "seq": {"$gte": next_seq}}, sort=[("seq", 1)], limit=limit
+        )
+        
+        for chunk in chunks:
+            # Chunks must be applied in order; wait for any gap to fill
+            if chunk['seq'] != next_seq:
+                break
             
-            # Update MongoDB with analysis results
-            update_result = self.mongo.db.eegdata.update_one(
-                {"_id": ObjectId(eeg_id)},
-                {
-                    "$set": {
-                        "svm_analysis": {
-                            "performed": True,
-                            "result": prediction,
-                            "confidence": confidence,
-                            "features_used": list(features.keys()),
-                            "performed_at": datetime.now(),
-                            "details": {
-                                "probabilities": probabilities,
-                                "key_features": {
-                                    "theta_beta_ratio": features.get("global_theta_beta_ratio"),
-                                    "frontal_theta": next((v for k, v in features.items() if 'frontal' in k.lower() and 'theta' in k.lower()), None),
-                                    "central_beta": next((v for k, v in features.items() if 'central' in k.lower() and 'beta' in k.lower()), None)
-                                }
-                            }
-                        }
+            try:
+                if stream is None:
+                    stream = {
+                        "key": key,
+                        "analyzer": StreamingBandPower(chunk['sfreq'], chunk['ch_names']),
+                        "next_seq": 0,
+                        "published_seconds": 0.0,
+                        "updated_at": time.time()
                     }
-                }
-            )
+                    self.streams[eeg_id] = stream
+                    self.mongo.db.eegdata.update_one(
+                        {"_id": ObjectId(eeg_id)},
+                        {"$unset": {"stream_status": "", "stream_error": ""}}
+                    )
+                    logger.info(f"Started streaming analysis for EEG {eeg_id}")
+                stream["analyzer"].push(decode_chunk(chunk))
+            except Exception as e:
+                logger.error(f"Error in streaming analysis for EEG {eeg_id}: {str(e)}")
+                self._abandon_stream(eeg_id, key, str(e), hand_off=False)
+                return
             
-            # Clean up temporary file
-            os.remove(temp_file_path)
+            next_seq += 1
+            stream["next_seq"] = next_seq
+            stream["updated_at"] = time.time()
+            consumed.append(chunk['_id'])
             
-            logger.info(f"Analysis completed for EEG {eeg_id}: {prediction} (confidence: {confidence:.2f})")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error processing EEG {eeg_id}: {str(e)}")
-            # Update MongoDB with error status
+            analyzer = stream["analyzer"]
+            if chunk.get('final'):
+                self._publish_stream(eeg_id, analyzer, final=True)
+                self.streams.pop(eeg_id, None)
+                break
+            elif analyzer.seconds - stream["published_seconds"] >= self.stream_publish_interval:
+                if self._publish_stream(eeg_id, analyzer, final=False):
+                    stream["published_seconds"] = analyzer.seconds
+        
+        if consumed:
+            self.mongo.db.eegchunks.delete_many({"_id": {"$in": consumed}})
+    
+    def _abandon_stream(self, eeg_id, key, reason, hand_off=True):
+        """
+        Stop analysing a live recording and record why on its document
+
+        Streaming state only lives in this process, so after a timeout, a lost
+        header chunk or a restart the recording is handed to the batch path if
+        its full data was uploaded, and otherwise marked Inconclusive. The
+        top-level stream_status keeps chunks that arrive later from triggering
+        this again.
+        """
+        logger.warning(f"Abandoning streaming analysis for EEG {eeg_id}: {reason}")
+        self.streams.pop(eeg_id, None)
+        self.mongo.db.eegchunks.delete_many({"eeg_id": key})
+        
+        not_abandoned = {"_id": ObjectId(eeg_id), "stream_status": {"$ne": "interrupted"}}
+        status = {"stream_status": "interrupted", "stream_error": reason}
+        if hand_off:
+            result = self.mongo.db.eegdata.update_one(
+                dict(not_abandoned, data={"$type": "binData"}),
+                {"$set": dict(status, **{"svm_analysis.requested": True, "svm_analysis.performed": False})}
+            )
+            if result.modified_count:
+                logger.info(f"EEG {eeg_id} queued for batch analysis of the uploaded recording")
+                return
+        self._store_error(eeg_id, f"Streaming analysis interrupted: {reason}",
+                          {"$set": status}, query=not_abandoned)
+    
+    def _publish_stream(self, eeg_id, analyzer, final):
+        """Store a provisional (or, for the last chunk, the final) streaming result"""
+        import numpy as np
+        from utils.feature_schema import DEFAULT_SCHEMA as schema
+        
+        features = schema.vectorize(analyzer.features())
+        if np.isnan(features).all():
+            # Not even one full Welch segment yet
+            if final:
+                self._store_error(eeg_id, ValueError(f"Recording too short for analysis ({analyzer.seconds:.1f}s)"))
+            return False
+        
+        prediction, confidence, probabilities = predict_adhd(features)
+        analysis = analysis_document(features, prediction, confidence, probabilities)
+        analysis["details"]["seconds_analyzed"] = analyzer.seconds
+        
+        if final:
+            analysis["mode"] = "streaming"
+            self._store_analysis(eeg_id, analysis)
+            eeg_data = self.mongo.db.eegdata.find_one(
+                {"_id": ObjectId(eeg_id)},
+                projection={"metadata": 1, "originalFilename": 1}
+            )
+            if eeg_data:
+                self._store_columns[eeg_id] = self._feature_store_columns(eeg_data)
+            self._append_to_feature_store(eeg_id, analysis)
+            self._flush_feature_store()
+            logger.info(f"Streaming analysis completed for EEG {eeg_id}: {prediction} (confidence: {confidence:.2f})")
+        else:
+            # Provisional results only carry the summary, not the feature vector
+            del analysis["features"]
+            analysis["performed"] = False
             self.mongo.db.eegdata.update_one(
                 {"_id": ObjectId(eeg_id)},
-                {
-                    "$set": {
-                        "svm_analysis.performed": True,
-                        "svm_analysis.result": "Inconclusive",
-                        "svm_analysis.error": str(e),
-                        "svm_analysis.performed_at": datetime.now()
-                    }
-                }
+                {"$set": {"svm_analysis.provisional": analysis}}
             )
-            return False
+            logger.info(f"Provisional result for EEG {eeg_id} after {analyzer.seconds:.0f}s: {prediction} (confidence: {confidence:.2f})")
+        return True
+    
+    def warm_up(self, profile):
+        """
+        Load the model and run a synthetic recording through the pipeline in
+        this process and in every worker before the service reports ready
+        """
+        with profile.phase('imports'):
+            profile.profile_imports()
+        
+        with profile.phase('feature_store'):
+            self._get_feature_store()
+        
+        with profile.phase('load_model'):
+            try:
+                load_model()
+            except Exception as e:
+                # Requests will come back Inconclusive, as they would without warm-up
+                logger.error(f"Could not load ADHD model: {str(e)}")
+        
+        with profile.phase('warm_up_local'):
+            prediction, confidence, _ = warm_up_worker()
+            logger.info(f"Warm-up prediction on synthetic recording: {prediction} (confidence: {confidence:.2f})")
+        
+        with profile.phase('warm_up_workers'):
+            self._get_pipeline().start()
     
-    def _predict_adhd(self, features):
-        """Use SVM model to predict ADHD from features"""
+    def _get_pipeline(self):
+        if self.pipeline is None:
+            self.pipeline = EEGPipeline(
+                fetch_fn=self._fetch_pending,
+                process_fn=analyze_eeg_record,
+                write_fn=self._store_pending,
+                error_fn=self._store_pending_error,
+                retry_fn=self._store_pending_retry,
+                workers=int(os.getenv('PIPELINE_WORKERS', '0')) or None,
+                prefetch=int(os.getenv('PIPELINE_PREFETCH', '4')),
+                write_queue_size=int(os.getenv('PIPELINE_WRITE_QUEUE', '0')) or None,
+                initializer=warm_up_worker
+            )
+        return self.pipeline
+    
+    def close(self):
+        if self.pipeline is not None:
+            self.pipeline.shutdown()
+            self.pipeline = None
+        self._flush_feature_store()
+    
+    def _fetch_eeg(self, eeg_id):
+        """Fetch the raw recording and its format from MongoDB"""
+        eeg_data = self.mongo.db.eegdata.find_one(
+            {"_id": ObjectId(eeg_id)},
+            projection={"data": 1, "format": 1, "metadata": 1, "originalFilename": 1}
+        )
+        
+        if not eeg_data:
+            logger.error(f"EEG data not found: {eeg_id}")
+            return None
+        
+        self._store_columns[eeg_id] = self._feature_store_columns(eeg_data)
+        
+        return {
+            "eeg_id": eeg_id,
+            "format": eeg_data['format'],
+            "data": eeg_data['data'],
+            "data_dir": self.data_dir,
+            "sidecar": self._array_sidecar(eeg_data)
+        }
+    
+    def _array_sidecar(self, eeg_data):
+        """
+        Sidecar for NumPy uploads built from the layout fields the backend's
+        upload route stores: metadata.sampleRate, channelNames, channelTypes,
+        units and layout
+        """
+        if eeg_data['format'].lower() != 'npy':
+            return None
+        
+        metadata = eeg_data.get('metadata') or {}
+        sidecar = {}
+        if metadata.get('sampleRate'):
+            sidecar['sfreq'] = metadata['sampleRate']
+        for field, key in (('channelNames', 'ch_names'), ('channelTypes', 'ch_types'),
+                           ('units', 'units'), ('layout', 'layout')):
+            value = metadata.get(field)
+            if not value:
+                continue
+            # One type or unit applies to every channel
+            if key in ('ch_types', 'units') and isinstance(value, list) and len(value) == 1:
+                value = value[0]
+            sidecar[key] = value
+        return sidecar or None
+    
+    def _store_analysis(self, eeg_id, analysis):
+        """Update MongoDB with analysis results"""
+        self.mongo.db.eegdata.update_one(
+            {"_id": ObjectId(eeg_id)},
+            {"$set": {"svm_analysis": analysis}}
+        )
+    
+    def _feature_store_columns(self, eeg_data):
+        """Patient and BIDS entity columns for the feature store"""
+        from utils.eeg_loader import extract_bids_info_from_filename
+        
+        metadata = eeg_data.get('metadata') or {}
+        subject = metadata.get('subject') or {}
+        bids_info = extract_bids_info_from_filename(eeg_data.get('originalFilename') or '')
+        
+        subject_id = _known(subject.get('id'))
+        return {
+            "patient_id": subject_id,
+            "group": _known(subject.get('group')),
+            "sub": bids_info['sub'] or subject_id,
+            "ses": bids_info['ses'] or _known(metadata.get('session')),
+            "task": bids_info['task'] or _known(metadata.get('task')),
+            "run": bids_info['run']
+        }
+    
+    def _append_to_feature_store(self, eeg_id, analysis):
+        """Append the analysis' feature vector to the columnar store"""
+        from utils.feature_schema import get_schema
+        
+        columns = self._store_columns.pop(eeg_id, {})
         try:
-            import joblib
-            from sklearn.preprocessing import StandardScaler
-            
-            # Load model
-            model_path = os.path.join(os.path.dirname(__file__), 'models', 'adhd_svm_model.pkl')
-            
-            # Check if model exists
-            if not os.path.exists(model_path):
-                logger.warning("ADHD model not found. Using dummy prediction.")
-                # Return dummy prediction (50/50 chance)
-                rand_val = np.random.random()
-                if rand_val > 0.5:
-                    return "ADHD", 0.7, {"ADHD": 0.7, "non-ADHD": 0.3}
-                else:
-                    return "non-ADHD", 0.65, {"ADHD": 0.35, "non-ADHD": 0.65}
-            
-            # Load the model
-            model = joblib.load(model_path)
-            
-            # Prepare feature vector
-            import pandas as pd
-            X = pd.DataFrame([features])
-            
-            # Make prediction
-            prediction = model.predict(X)[0]
-            probabilities = model.predict_proba(X)[0]
-            
-            # Get confidence (probability of the predicted class)
-            class_idx = np.where(model.classes_ == prediction)[0][0]
-            confidence = probabilities[class_idx]
-            
-            # Format probabilities as dictionary
-            prob_dict = {cls: float(prob) for cls, prob in zip(model.classes_, probabilities)}
-            
-            return prediction, float(confidence), prob_dict
-            
+            encoded = analysis['features']
+            vector = get_schema(encoded['schema_version']).decode(encoded)
+            self._get_feature_store().append(dict(
+                columns,
+                eeg_id=eeg_id,
+                result=analysis['result'],
+                confidence=analysis['confidence'],
+                performed_at=analysis['performed_at']
+            ), vector, encoded['schema_version'])
         except Exception as e:
-            logger.error(f"Prediction error: {str(e)}")
-            return "Inconclusive", 0.0, {"ADHD": 0.0, "non-ADHD": 0.0, "Inconclusive": 1.0}
+            # The Mongo document is the source of truth; never fail the analysis here
+            logger.warning(f"Could not append features for EEG {eeg_id} to feature store: {str(e)}")
+    
+    def _get_feature_store(self):
+        with self._feature_store_lock:
+            if self.feature_store is None:
+                from utils.feature_store import FeatureStore
+                self.feature_store = FeatureStore(self.feature_store_dir)
+            return self.feature_store
+    
+    def _flush_feature_store(self):
+        """Write buffered feature rows; failures are logged, never raised"""
+        if self.feature_store is None:
+            return
+        try:
+            self.feature_store.flush()
+        except Exception as e:
+            logger.warning(f"Could not flush feature store: {str(e)}")
+    
+    def _store_error(self, eeg_id, error, extra_update=None, query=None):
+        """Update MongoDB with error status, optionally only if the document matches query"""
+        self._store_columns.pop(eeg_id, None)
+        update = {
+            "$set": {
+                "svm_analysis.performed": True,
+                "svm_analysis.result": "Inconclusive",
+                "svm_analysis.error": str(error),
+                "svm_analysis.performed_at": datetime.now()
+            }
+        }
+        for op, fields in (extra_update or {}).items():
+            update.setdefault(op, {}).update(fields)
+        self.mongo.db.eegdata.update_one(query or {"_id": ObjectId(eeg_id)}, update)
+    
+    def _fetch_pending(self, eeg_id):
+        logger.info(f"Processing pending request for EEG {eeg_id}")
+        
+        # Mark as in-progress
+        self.mongo.db.eegdata.update_one(
+            {"_id": ObjectId(eeg_id)},
+            {"$set": {"svm_analysis.in_progress": True}}
+        )
+        return self._fetch_eeg(eeg_id)
+    
+    def _store_pending(self, eeg_id, analysis):
+        # Storing the whole svm_analysis document also drops the requested flag
+        analysis["in_progress"] = False
+        self._store_analysis(eeg_id, analysis)
+        self._append_to_feature_store(eeg_id, analysis)
+        health.heartbeat()
+        logger.info(f"Analysis completed for EEG {eeg_id}: {analysis['result']} (confidence: {analysis['confidence']:.2f})")
+    
+    def _store_pending_error(self, eeg_id, error):
+        logger.error(f"Error processing EEG {eeg_id}: {str(error)}")
+        # Mark as no longer requested in the same round trip
+        self._store_error(eeg_id, error, {
+            "$set": {"svm_analysis.in_progress": False},
+            "$unset": {"svm_analysis.requested": ""}
+        })
+
+    def _store_pending_retry(self, eeg_id, suspect):
+        """
+        Put a recording lost to a dead worker back in the queue
+
+        Suspects (recordings that were running when the worker died) count an
+        attempt and are marked Inconclusive once they reach max_attempts.
+        """
+        from pymongo import ReturnDocument
+        
+        self._store_columns.pop(eeg_id, None)
+        update = {"$set": {"svm_analysis.in_progress": False}}
+        if suspect:
+            update["$inc"] = {"svm_analysis.attempts": 1}
+        eeg_data = self.mongo.db.eegdata.find_one_and_update(
+            {"_id": ObjectId(eeg_id)}, update,
+            projection={"svm_analysis.attempts": 1}, return_document=ReturnDocument.AFTER
+        )
+        attempts = ((eeg_data or {}).get('svm_analysis') or {}).get('attempts', 0)
+        
+        if suspect and attempts >= self.max_attempts:
+            self._store_pending_error(eeg_id, RuntimeError(
+                f"Worker process died {attempts} times while analysing this recording"))
+        else:
+            logger.warning(f"EEG {eeg_id} will be retried after a worker crash (attempts: {attempts})")
 
 # File watcher to process new requests
 class RequestHandler(FileSystemEventHandler):
@@ -207,30 +753,21 @@ def poll_mongodb(mongo_connection, processor):
                     {"svm_analysis.requested": True, "svm_analysis.performed": False},
                     {"svm_analysis.requested": True, "svm_analysis.performed": {"$exists": False}}
                 ]
-            })
+            }, projection={"_id": 1, "svm_analysis.attempts": 1})
             
-            # Process each pending request
+            # Collect the IDs up front so the cursor is not held open for the whole batch
+            eeg_ids, suspects = [], []
             for request in pending_requests:
-                eeg_id = str(request["_id"])
-                logger.info(f"Processing pending request for EEG {eeg_id}")
-                
-                # Mark as in-progress
-                mongo_connection.db.eegdata.update_one(
-                    {"_id": ObjectId(eeg_id)},
-                    {"$set": {"svm_analysis.in_progress": True}}
-                )
-                
-                # Process the request
-                processor.process_eeg_request(eeg_id)
-                
-                # Mark as no longer requested
-                mongo_connection.db.eegdata.update_one(
-                    {"_id": ObjectId(eeg_id)},
-                    {
-                        "$set": {"svm_analysis.in_progress": False},
-                        "$unset": {"svm_analysis.requested": ""}
-                    }
-                )
+                eeg_ids.append(str(request["_id"]))
+                if request.get("svm_analysis", {}).get("attempts"):
+                    suspects.append(eeg_ids[-1])
+            
+            # Process the batch through the prefetch pipeline
+            if eeg_ids:
+                processor.process_batch(eeg_ids, suspects)
+            
+            # Only report alive when polling and the batch both succeeded
+            health.heartbeat()
             
         except Exception as e:
             logger.error(f"Error polling MongoDB: {str(e)}")
@@ -238,18 +775,48 @@ def poll_mongodb(mongo_connection, processor):
         # Sleep before next poll
         time.sleep(10)
 
+# Poll MongoDB for chunks of live recordings
+def poll_streams(processor):
+    interval = float(os.getenv('STREAM_POLL_INTERVAL', '1'))
+    while True:
+        try:
+            processor.process_stream_chunks()
+        except Exception as e:
+            logger.error(f"Error polling EEG streams: {str(e)}")
+        
+        time.sleep(interval)
+
 # Main function
 def main():
+    profile = StartupProfile()
+    health.clear()
+    
     # Create MongoDB connection
     mongo_connection = MongoDBConnection()
-    if not mongo_connection.connect():
+    with profile.phase('mongo_connect'):
+        connected = mongo_connection.connect()
+    if not connected:
         logger.error("Failed to connect to MongoDB. Exiting.")
         return
     
     # Create processor
     processor = EEGProcessor(mongo_connection)
     
+    # Warm up before reporting ready so the first request is not the slow one
     try:
+        processor.warm_up(profile)
+    except Exception as e:
+        logger.error(f"Warm-up failed, not reporting ready: {str(e)}")
+        processor.close()
+        mongo_connection.close()
+        return
+    
+    profile.log()
+    health.mark_ready(profile.report())
+    
+    try:
+        from watchdog.observers import Observer
+        
         # Start file watcher for request files
         request_handler = RequestHandler(processor)
         observer = Observer()
@@ -257,6 +824,11 @@ def main():
         observer.start()
         logger.info(f"File watcher started for directory: {processor.data_dir}")
         
+        # Start streaming analysis of live recordings in the background
+        stream_thread = threading.Thread(target=poll_streams, args=(processor,), name='eeg-streams', daemon=True)
+        stream_thread.start()
+        logger.info("Started polling for live recording chunks")
+        
         # Start MongoDB polling in the main thread
         logger.info("Starting MongoDB polling for analysis requests")
         poll_mongodb(mongo_connection, processor)
@@ -270,6 +842,7 @@ def main():
     
     finally:
         observer.join()
+        processor.close()
         mongo_connection.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+# tests/test_eeg_loader.py - Memory-mapped .npy/.npz loading with sidecar metadata
+import json
+import zipfile
+
+import numpy as np
+import pytest
+
+import processor
+from utils.eeg_loader import _load_npz, load_numpy_eeg
+
+CH_NAMES = ['Fz', 'Cz', 'Pz']
+
+
+def _array(n_channels=3, n_times=500, dtype=np.float64):
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal((n_channels, n_times)) * 1e-5).astype(dtype)
+
+
+def _local_extra_length(path, member='data.npy'):
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(member)
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset + 28)
+        return int.from_bytes(f.read(2), 'little')
+
+
+def test_stored_npz_is_memory_mapped_past_a_zip64_header(tmp_path):
+    path = str(tmp_path / 'rec.npz')
+    data = _array()
+    # Another member first, so data.npy does not start at offset 0
+    np.savez(path, sfreq=np.array(256.0), ch_names=np.array(CH_NAMES), data=data)
+    # numpy writes every member with a zip64 extra field in its local header
+    assert _local_extra_length(path) > 0
+
+    loaded, metadata = _load_npz(path)
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, data)
+    assert metadata == {'sfreq': 256.0, 'ch_names': CH_NAMES}
+
+
+def test_compressed_npz_is_inflated(tmp_path):
+    path = str(tmp_path / 'rec.npz')
+    data = _array(dtype=np.float32)
+    np.savez_compressed(path, data=data)
+
+    loaded, metadata = _load_npz(path)
+    assert not isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(loaded, data)
+    assert metadata == {}
+
+
+def test_fortran_ordered_npz(tmp_path):
+    path = str(tmp_path / 'rec.npz')
+    data = np.asfortranarray(_array())
+    np.savez(path, data=data)
+
+    loaded, _ = _load_npz(path)
+    np.testing.assert_array_equal(loaded, data)
+
+
+def test_npz_without_data_is_rejected(tmp_path):
+    path = str(tmp_path / 'rec.npz')
+    np.savez(path, other=_array())
+    with pytest.raises(ValueError):
+        _load_npz(path)
+
+
+def test_npy_with_sidecar_times_first_and_units(tmp_path):
+    path = tmp_path / 'rec.npy'
+    microvolts = _array().T * 1e6
+    np.save(path, microvolts)
+    (tmp_path / 'rec.json').write_text(json.dumps({
+        'sfreq': 128, 'ch_names': CH_NAMES, 'units': 'uV', 'layout': 'times_first'
+    }))
+
+    raw = load_numpy_eeg(str(path))
+    assert raw.ch_names == CH_NAMES
+    assert raw.info['sfreq'] == 128
+    np.testing.assert_allclose(raw.get_data(), microvolts.T * 1e-6)
+
+
+def test_per_channel_units(tmp_path):
+    path = tmp_path / 'rec.npy'
+    data = _array()
+    np.save(path, data)
+    (tmp_path / 'rec.json').write_text(json.dumps({'sfreq': 128, 'units': ['V', 'mV', 'uV']}))
+
+    raw = load_numpy_eeg(str(path))
+    assert raw.ch_names == ['ch0', 'ch1', 'ch2']
+    np.testing.assert_allclose(raw.get_data(), data * np.array([[1.0], [1e-3], [1e-6]]))
+
+
+def test_sidecar_wins_over_npz_metadata(tmp_path):
+    path = tmp_path / 'rec.npz'
+    np.savez(path, sfreq=np.array(256.0), ch_names=np.array(['a', 'b', 'c']), data=_array())
+    (tmp_path / 'rec.json').write_text(json.dumps({'ch_names': CH_NAMES}))
+
+    raw = load_numpy_eeg(str(path))
+    assert raw.ch_names == CH_NAMES
+    assert raw.info['sfreq'] == 256.0
+
+
+@pytest.mark.parametrize('sidecar', [{'ch_names': ['Fz', 'Cz']}, {'units': 'kV'}])
+def test_invalid_sidecar_is_rejected(tmp_path, sidecar):
+    path = tmp_path / 'rec.npy'
+    np.save(path, _array())
+    (tmp_path / 'rec.json').write_text(json.dumps(sidecar))
+    with pytest.raises(ValueError):
+        load_numpy_eeg(str(path))
+
+
+def test_sidecar_from_upload_metadata():
+    eeg_processor = processor.EEGProcessor(None)
+    sidecar = eeg_processor._array_sidecar({
+        'format': 'npy',
+        'metadata': {
+            'sampleRate': 512, 'channelNames': CH_NAMES, 'channelTypes': ['eeg'],
+            'units': ['uV', 'uV', 'mV'], 'layout': 'times_first'
+        }
+    })
+    assert sidecar == {'sfreq': 512, 'ch_names': CH_NAMES, 'ch_types': 'eeg',
+                       'units': ['uV', 'uV', 'mV'], 'layout': 'times_first'}
+    assert eeg_processor._array_sidecar({'format': 'npy', 'metadata': {'sampleRate': None}}) is None
+    assert eeg_processor._array_sidecar({'format': 'edf', 'metadata': {'sampleRate': 250}}) is None
@@ -0,0 +1,76 @@
+# tests/test_feature_store.py - Appends, compaction and reads of the Parquet feature store
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pyarrow.dataset as ds
+
+import processor
+from utils.feature_schema import DEFAULT_SCHEMA
+from utils.feature_store import FeatureStore
+
+
+def _vector(value):
+    return np.full(len(DEFAULT_SCHEMA), value, dtype=np.float32)
+
+
+def _parquet_files(root):
+    return [f for _, _, files in os.walk(root) for f in files if f.endswith('.parquet')]
+
+
+def test_flushes_compact_once_a_partition_has_many_files(tmp_path):
+    store = FeatureStore(str(tmp_path), compact_files=8)
+    day = datetime(2026, 1, 5, 12)
+    for i in range(20):
+        store.append({'eeg_id': f'r{i}', 'performed_at': day}, _vector(i))
+        store.flush()
+
+    assert len(_parquet_files(tmp_path)) < 8
+    X, meta = store.load_matrix(feature_names=[DEFAULT_SCHEMA.names[0]])
+    assert sorted(meta.column('eeg_id').to_pylist()) == sorted(f'r{i}' for i in range(20))
+    assert sorted(X[:, 0]) == list(range(20))
+
+
+def test_load_matrix_keeps_the_latest_analysis_per_recording(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    first = datetime(2026, 1, 5, 12)
+    store.append({'eeg_id': 'a', 'group': 'ADHD', 'performed_at': first}, _vector(1))
+    store.append({'eeg_id': 'b', 'group': 'control', 'performed_at': first}, _vector(2))
+    store.flush()
+    # Re-analysis of 'a' on a later day, in another partition
+    store.append({'eeg_id': 'a', 'group': 'ADHD', 'performed_at': first + timedelta(days=1)}, _vector(3))
+    store.flush()
+
+    X, meta = store.load_matrix(feature_names=[DEFAULT_SCHEMA.names[0]], metadata_columns=('eeg_id', 'group'))
+    rows = dict(zip(meta.column('eeg_id').to_pylist(), X[:, 0]))
+    assert rows == {'a': 3, 'b': 2}
+    assert meta.column_names == ['eeg_id', 'group']
+
+    X, _ = store.load_matrix(feature_names=[DEFAULT_SCHEMA.names[0]], latest_only=False)
+    assert len(X) == 3
+
+    X, meta = store.load_matrix(filter=ds.field('group') == 'control')
+    assert meta.column('eeg_id').to_pylist() == ['b']
+
+
+def test_bad_rows_are_dropped_without_blocking_later_flushes(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    store.append({'eeg_id': 'a', 'patient_id': 123}, _vector(1))
+    store.append({'eeg_id': 'b', 'confidence': 'not-a-number'}, _vector(2))
+    store.flush()
+    store.append({'eeg_id': 'c'}, _vector(3))
+    store.flush()
+
+    table = store.read(['eeg_id', 'patient_id'])
+    assert sorted(table.to_pylist(), key=lambda row: row['eeg_id']) == [
+        {'eeg_id': 'a', 'patient_id': '123'},
+        {'eeg_id': 'c', 'patient_id': None}
+    ]
+
+
+def test_backend_placeholders_are_stored_as_missing():
+    columns = processor.EEGProcessor(None)._feature_store_columns({
+        'originalFilename': 'recording.edf',
+        'metadata': {'subject': {'id': 'unknown', 'group': None}, 'session': 'unknown', 'task': 'rest'}
+    })
+    assert columns == {'patient_id': None, 'group': None, 'sub': None, 'ses': None, 'task': 'rest', 'run': None}
@@ -0,0 +1,114 @@
+# tests/test_inference.py - The compiled SVM must score like the pickled sklearn model
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+import processor
+from utils.feature_schema import DEFAULT_SCHEMA
+from utils.inference import CompiledSVMBackend, InferenceBackend, SklearnBackend, export_compiled_model
+
+FEATURE_NAMES = list(DEFAULT_SCHEMA.names[:12])
+
+
+def _fit(kernel):
+    rng = np.random.default_rng(42)
+    X = rng.standard_normal((120, len(FEATURE_NAMES)))
+    y = np.where(X[:, 0] + 0.5 * X[:, 1] ** 2 + 0.3 * rng.standard_normal(120) > 0.5, 'ADHD', 'non-ADHD')
+    model = make_pipeline(StandardScaler(), SVC(kernel=kernel, probability=True, random_state=0))
+    model.fit(pd.DataFrame(X, columns=FEATURE_NAMES), y)
+    return model
+
+
+@pytest.fixture(params=['rbf', 'linear', 'poly', 'sigmoid'])
+def backends(request, tmp_path):
+    model = _fit(request.param)
+    path = str(tmp_path / 'model.npz')
+    export_compiled_model(model, path)
+    return SklearnBackend(model), CompiledSVMBackend.load(path)
+
+
+def test_compiled_matches_sklearn(backends):
+    sklearn_backend, compiled = backends
+    X = np.random.default_rng(7).standard_normal((200, len(FEATURE_NAMES)))
+
+    assert compiled.feature_names == FEATURE_NAMES
+    assert list(compiled.classes_) == list(sklearn_backend.classes_)
+    np.testing.assert_array_equal(compiled.predict(X), sklearn_backend.predict(X))
+    np.testing.assert_allclose(compiled.predict_proba(X), sklearn_backend.predict_proba(X), atol=1e-9)
+
+
+@pytest.mark.parametrize('bad_value', [np.nan, np.inf])
+def test_non_finite_input_is_rejected(backends, bad_value):
+    X = np.zeros((1, len(FEATURE_NAMES)))
+    X[0, 3] = bad_value
+    for backend in backends:
+        with pytest.raises(ValueError):
+            backend.predict(X)
+        with pytest.raises(ValueError):
+            backend.predict_proba(X)
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_missing_features_are_inconclusive(backends, compiled, monkeypatch):
+    backend = backends[compiled]
+    monkeypatch.setattr(processor, 'load_model', lambda: backend)
+    monkeypatch.setitem(processor._model_cache, 'columns', DEFAULT_SCHEMA.column_indices(FEATURE_NAMES))
+
+    features = np.zeros(len(DEFAULT_SCHEMA), dtype=np.float32)
+    prediction, _, _ = processor.predict_adhd(features)
+    assert prediction in backend.classes_
+
+    features[DEFAULT_SCHEMA.index[FEATURE_NAMES[3]]] = np.nan
+    prediction, confidence, probabilities = processor.predict_adhd(features)
+    assert prediction == 'Inconclusive'
+    assert confidence == 0.0
+    assert probabilities['Inconclusive'] == 1.0
+
+
+def test_incomplete_backend_cannot_be_created():
+    class PredictOnly(InferenceBackend):
+        def predict(self, X):
+            return X
+
+    with pytest.raises(TypeError):
+        PredictOnly()
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    # load_model reads models/ next to processor.py
+    monkeypatch.setattr(processor, '__file__', str(tmp_path / 'processor.py'))
+    monkeypatch.setattr(processor, '_model_cache', dict(processor._model_cache, key=None))
+    (tmp_path / 'models').mkdir()
+    return tmp_path / 'models'
+
+
+@pytest.mark.parametrize('backend', ['compiled', 'sklearn'])
+def test_forced_backend_without_model_is_inconclusive(model_dir, backend, monkeypatch):
+    monkeypatch.setenv('INFERENCE_BACKEND', backend)
+    features = np.zeros(len(DEFAULT_SCHEMA), dtype=np.float32)
+
+    prediction, confidence, probabilities = processor.predict_adhd(features)
+    assert prediction == 'Inconclusive'
+    assert confidence == 0.0
+
+
+def test_stale_pickle_warns_once(model_dir, monkeypatch, caplog):
+    import os
+    import pickle
+
+    monkeypatch.setenv('INFERENCE_BACKEND', 'auto')
+    model = _fit('rbf')
+    export_compiled_model(model, str(model_dir / 'adhd_svm_model.npz'))
+    pickled = model_dir / 'adhd_svm_model.pkl'
+    pickled.write_bytes(pickle.dumps(model))
+    mtime = os.path.getmtime(model_dir / 'adhd_svm_model.npz') + 10
+    os.utime(pickled, (mtime, mtime))
+
+    with caplog.at_level('WARNING', logger='eeg_processor'):
+        for _ in range(3):
+            assert isinstance(processor.load_model(), SklearnBackend)
+    assert sum('is newer than' in r.getMessage() for r in caplog.records) == 1
@@ -0,0 +1,153 @@
+# tests/test_pipeline.py - Ordering, error routing and worker crash recovery of EEGPipeline
+import os
+import threading
+import time
+
+import pytest
+
+import processor
+from utils.pipeline import DEFAULT_MAX_WORKERS, EEGPipeline, default_workers
+
+CRASH_KEY = 1
+
+
+def _square_slowly(payload):
+    # Later keys finish first, so results complete out of submission order
+    time.sleep(0.05 * (5 - payload % 5))
+    if payload == 7:
+        raise ValueError("bad recording")
+    return payload * payload
+
+
+def _crash_on_key(payload):
+    if payload == CRASH_KEY:
+        os._exit(1)
+    time.sleep(0.3)
+    return payload
+
+
+class Recorder:
+    def __init__(self, fetch_error_keys=(), skip_keys=()):
+        self.fetch_error_keys = set(fetch_error_keys)
+        self.skip_keys = set(skip_keys)
+        self.fetched = []
+        self.written = []
+        self.errors = []
+        self.retried = []
+
+    def fetch(self, key):
+        self.fetched.append(key)
+        if key in self.fetch_error_keys:
+            raise IOError("fetch failed")
+        return None if key in self.skip_keys else key
+
+    def write(self, key, result):
+        self.written.append((key, result))
+
+    def error(self, key, exception):
+        self.errors.append((key, type(exception).__name__))
+
+    def retry(self, key, suspect):
+        self.retried.append((key, suspect))
+
+    def pipeline(self, **kwargs):
+        return EEGPipeline(self.fetch, kwargs.pop('process_fn', _square_slowly), self.write, self.error,
+                           retry_fn=self.retry, **kwargs)
+
+
+def _pipeline_threads():
+    return [t for t in threading.enumerate() if t.name.startswith('eeg-pipeline')]
+
+
+def test_results_are_written_in_submission_order():
+    recorder = Recorder(fetch_error_keys=[3], skip_keys=[5])
+    pipeline = recorder.pipeline(workers=3, prefetch=2)
+    try:
+        report = pipeline.run(range(10))
+    finally:
+        pipeline.shutdown()
+
+    assert recorder.written == [(k, k * k) for k in (0, 1, 2, 4, 6, 8, 9)]
+    assert sorted(recorder.errors) == [(3, 'OSError'), (7, 'ValueError')]
+    assert recorder.retried == []
+    assert report['process']['items'] == 7
+    assert report['process']['errors'] == 1
+    assert not pipeline.broken
+    assert _pipeline_threads() == []
+
+
+def test_worker_crash_retries_fetched_recordings_and_stops_fetching():
+    recorder = Recorder()
+    pipeline = recorder.pipeline(process_fn=_crash_on_key, workers=1, prefetch=1, write_queue_size=2)
+    try:
+        pipeline.run(range(20))
+    finally:
+        pipeline.shutdown()
+
+    assert pipeline.broken
+    assert (CRASH_KEY, True) in recorder.retried
+    # Every fetched recording is either written or retried, never marked failed
+    assert recorder.errors == []
+    assert sorted([k for k, _ in recorder.written] + [k for k, _ in recorder.retried]) == sorted(recorder.fetched)
+    # The rest of the batch is left unfetched, so it stays requested
+    assert len(recorder.fetched) < 20
+    assert _pipeline_threads() == []
+
+
+def test_broken_pool_never_blames_unsubmitted_recordings():
+    recorder = Recorder()
+    pipeline = recorder.pipeline(process_fn=_crash_on_key, workers=1, prefetch=1)
+    try:
+        pipeline.run([CRASH_KEY])
+        recorder.retried.clear()
+        recorder.fetched.clear()
+        # submit() now raises BrokenProcessPool; nothing reaches a worker
+        pipeline.run(range(2, 12))
+    finally:
+        pipeline.shutdown()
+
+    assert recorder.retried
+    assert all(not suspect for _, suspect in recorder.retried)
+    assert [k for k, _ in recorder.retried] == recorder.fetched
+    assert _pipeline_threads() == []
+
+
+def test_default_workers_is_bounded():
+    assert 1 <= default_workers() <= DEFAULT_MAX_WORKERS
+    assert default_workers(max_workers=1) == 1
+
+
+class _FakePipeline:
+    def __init__(self, runs, break_on):
+        self.runs = runs
+        self.break_on = break_on
+        self.broken = False
+
+    def run(self, keys):
+        self.runs.append(list(keys))
+        self.broken = self.break_on in keys
+        stage = {'items': len(keys), 'errors': 0, 'busy_seconds': 0.0, 'utilization': 0.0}
+        return {'fetch': stage, 'process': stage, 'write': stage, 'wall_seconds': 0.0}
+
+    def shutdown(self):
+        pass
+
+
+def test_suspects_run_alone_on_a_fresh_pool(monkeypatch):
+    runs = []
+    created = []
+    eeg_processor = processor.EEGProcessor(None)
+
+    def get_pipeline():
+        if eeg_processor.pipeline is None:
+            eeg_processor.pipeline = _FakePipeline(runs, break_on='b')
+            created.append(eeg_processor.pipeline)
+        return eeg_processor.pipeline
+
+    monkeypatch.setattr(eeg_processor, '_get_pipeline', get_pipeline)
+    with pytest.raises(RuntimeError):
+        eeg_processor.process_batch(['a', 'b', 'c', 'd'], suspects=['b', 'd'])
+
+    assert runs == [['a', 'c'], ['b'], ['d']]
+    # The pool broken by 'b' is replaced before 'd' runs
+    assert len(created) == 2
@@ -0,0 +1,161 @@
+# tests/test_streaming.py - Incremental band power and chunk consumption for live recordings
+import numpy as np
+import pytest
+from scipy import signal
+
+import processor
+from utils.streaming import StreamingBandPower, decode_chunk
+
+SFREQ = 128.0
+CH_NAMES = ['Fz', 'Cz', 'Pz', 'O1']
+
+
+def _recording(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.standard_normal((len(CH_NAMES), int(SFREQ * seconds))), axis=1) * 1e-6
+
+
+@pytest.mark.parametrize('n_chunks', [1, 7, 45])
+def test_psd_matches_mne_welch_on_the_causally_filtered_signal(n_chunks):
+    mne = pytest.importorskip('mne')
+    data = _recording(30)
+
+    analyzer = StreamingBandPower(SFREQ, CH_NAMES)
+    for chunk in np.array_split(data, n_chunks, axis=1):
+        analyzer.push(chunk)
+
+    # The same causal filter over the whole recording at once
+    zi = signal.sosfilt_zi(analyzer._sos)[:, None, :] * data[None, :, :1]
+    filtered, _ = signal.sosfilt(analyzer._sos, data, axis=-1, zi=zi)
+    expected, freqs = mne.time_frequency.psd_array_welch(
+        filtered, SFREQ, fmin=0.5, fmax=50, n_fft=int(SFREQ * 2),
+        n_overlap=int(SFREQ), n_per_seg=int(SFREQ * 2), verbose=False
+    )
+
+    psd, stream_freqs = analyzer.psd()
+    np.testing.assert_allclose(stream_freqs, freqs)
+    np.testing.assert_allclose(psd, expected, rtol=1e-10)
+
+
+def test_nothing_is_reported_before_the_first_full_segment():
+    analyzer = StreamingBandPower(SFREQ, CH_NAMES)
+    analyzer.push(_recording(1.5))
+    assert analyzer.psd()[0] is None
+    assert analyzer.features() == {}
+
+    analyzer.push(_recording(1, seed=1))
+    assert analyzer.psd()[0] is not None
+    assert 'global_theta_beta_ratio' in analyzer.features()
+
+
+def test_channel_count_mismatch_is_rejected():
+    analyzer = StreamingBandPower(SFREQ, CH_NAMES)
+    with pytest.raises(ValueError):
+        analyzer.push(np.zeros((len(CH_NAMES) - 1, 10)))
+
+
+def test_channel_labels_are_normalized():
+    assert StreamingBandPower(SFREQ, ['EEG Fp1-REF', 'T3']).ch_names == ['Fp1', 'T7']
+
+
+# Chunk consumption through EEGProcessor, against an in-memory MongoDB
+
+def _chunk(eeg_id, seq, data, final=False):
+    chunk = {
+        'eeg_id': eeg_id,
+        'seq': seq,
+        'n_channels': len(CH_NAMES),
+        'data': data.astype('<f4').tobytes(),
+        'final': final
+    }
+    if seq == 0:
+        chunk.update(sfreq=SFREQ, ch_names=CH_NAMES)
+    return chunk
+
+
+@pytest.fixture
+def stream_processor(tmp_path, monkeypatch):
+    mongomock = pytest.importorskip('mongomock')
+
+    class Connection:
+        db = mongomock.MongoClient().eegility
+
+    monkeypatch.setattr(processor, 'predict_adhd', lambda features: ('non-ADHD', 0.8, {'ADHD': 0.2, 'non-ADHD': 0.8}))
+    eeg_processor = processor.EEGProcessor(Connection())
+    eeg_processor.feature_store_dir = str(tmp_path)
+    return eeg_processor
+
+
+def _insert_recording(db, seconds, n_chunks, final=True, skip=()):
+    eeg_id = db.eegdata.insert_one({'format': 'edf'}).inserted_id
+    parts = np.array_split(_recording(seconds), n_chunks, axis=1)
+    chunks = [_chunk(eeg_id, seq, part, final=final and seq == n_chunks - 1) for seq, part in enumerate(parts)]
+    db.eegchunks.insert_many([c for c in chunks if c['seq'] not in skip])
+    return eeg_id, chunks
+
+
+def test_chunks_are_applied_in_order_and_wait_for_gaps(stream_processor):
+    db = stream_processor.mongo.db
+    eeg_id, chunks = _insert_recording(db, 20, 5, skip=[2])
+
+    stream_processor.process_stream_chunks()
+    stream = stream_processor.streams[str(eeg_id)]
+    assert stream['next_seq'] == 2
+    # Chunks after the gap are kept until it is filled
+    assert sorted(c['seq'] for c in db.eegchunks.find()) == [3, 4]
+
+    db.eegchunks.insert_one(chunks[2])
+    stream_processor.process_stream_chunks()
+    assert str(eeg_id) not in stream_processor.streams
+    assert db.eegchunks.count_documents({}) == 0
+
+    analysis = db.eegdata.find_one({'_id': eeg_id})['svm_analysis']
+    assert analysis['mode'] == 'streaming'
+    assert analysis['details']['seconds_analyzed'] == pytest.approx(20)
+
+
+def test_a_stuck_stream_does_not_starve_the_others(stream_processor):
+    db = stream_processor.mongo.db
+    # Inserted first, so it sorts first: many chunks waiting behind a missing header
+    stuck_id, _ = _insert_recording(db, 20, 40, skip=[0])
+    done_id, _ = _insert_recording(db, 10, 4)
+
+    stream_processor.process_stream_chunks(limit=10)
+
+    assert db.eegdata.find_one({'_id': done_id})['svm_analysis']['mode'] == 'streaming'
+    assert db.eegchunks.count_documents({'eeg_id': stuck_id}) == 39
+
+
+def test_lost_header_is_reported_once(stream_processor):
+    db = stream_processor.mongo.db
+    eeg_id, chunks = _insert_recording(db, 10, 4, skip=[0])
+    stream_processor.stream_idle_timeout = -1
+
+    stream_processor.process_stream_chunks()
+    document = db.eegdata.find_one({'_id': eeg_id})
+    assert document['stream_status'] == 'interrupted'
+    assert document['svm_analysis']['result'] == 'Inconclusive'
+    assert db.eegchunks.count_documents({}) == 0
+
+    # A late chunk must not overwrite the recorded outcome
+    performed_at = document['svm_analysis']['performed_at']
+    db.eegchunks.insert_one(chunks[3])
+    stream_processor.process_stream_chunks()
+    assert db.eegdata.find_one({'_id': eeg_id})['svm_analysis']['performed_at'] == performed_at
+
+
+def test_one_bad_recording_does_not_stop_the_poll(stream_processor):
+    db = stream_processor.mongo.db
+    # Not an ObjectId, so it has no generation time
+    db.eegchunks.insert_one({'_id': 'bad', 'eeg_id': 'bad', 'seq': 1, 'n_channels': 1, 'data': b''})
+    done_id, _ = _insert_recording(db, 10, 4)
+
+    stream_processor.process_stream_chunks()
+    assert db.eegdata.find_one({'_id': done_id})['svm_analysis']['mode'] == 'streaming'
+
+
+def test_decode_chunk_round_trips_float32():
+    data = _recording(1)
+    decoded = decode_chunk(_chunk('x', 1, data))
+    assert decoded.dtype == np.float64
+    np.testing.assert_array_equal(decoded, data.astype(np.float32))
@@ -0,0 +1,84 @@
+# train_model.py - Train the ADHD SVM model from the columnar feature store
+import os
+import time
+import logging
+import argparse
+
+import numpy as np
+import pyarrow.dataset as ds
+
+from utils.feature_schema import DEFAULT_SCHEMA
+from utils.feature_store import FeatureStore
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('eeg_processor.train')
+
+
+def parse_args():
+    data_dir = os.getenv('DATA_DIR', '/app/data')
+    parser = argparse.ArgumentParser(description="Train the ADHD SVM model from stored feature vectors")
+    parser.add_argument('--store', default=os.getenv('FEATURE_STORE_DIR', os.path.join(data_dir, 'feature_store')),
+                        help="Feature store directory")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'adhd_svm_model.pkl'),
+                        help="Where to write the trained model")
+    parser.add_argument('--task', default=None, help="Only train on recordings of this BIDS task")
+    parser.add_argument('--adhd-group', default='ADHD', help="Subject group value labelling ADHD recordings")
+    parser.add_argument('--control-group', action='append', default=None,
+                        help="Subject group value labelling non-ADHD recordings (repeatable, default: control)")
+    parser.add_argument('--no-compiled', action='store_true',
+                        help="Skip exporting the NumPy-only .npz model next to the pickle")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = FeatureStore(args.store)
+
+    # Only recordings with an explicit ADHD or control label, optionally restricted
+    # to one task; other groups (e.g. "patient") are neither class
+    control_groups = args.control_group or ['control']
+    predicate = ds.field('group').isin([args.adhd_group] + control_groups)
+    if args.task:
+        predicate = predicate & (ds.field('task') == args.task)
+
+    started = time.perf_counter()
+    # One row per recording: the latest analysis wins over earlier ones
+    X, meta = store.load_matrix(metadata_columns=('eeg_id', 'group'), filter=predicate)
+    logger.info(f"Loaded {X.shape[0]} recordings x {X.shape[1]} features in {time.perf_counter() - started:.2f}s")
+
+    # Keep features present in every recording; the montage decides which ones exist
+    columns = ~np.isnan(X).any(axis=0)
+    feature_names = [name for name, keep in zip(DEFAULT_SCHEMA.names, columns) if keep]
+    X = X[:, columns]
+    y = np.where(meta.column('group').to_numpy(zero_copy_only=False) == args.adhd_group, 'ADHD', 'non-ADHD')
+
+    if len(np.unique(y)) < 2:
+        logger.error("Training data needs both ADHD and non-ADHD recordings. Exiting.")
+        return
+
+    import joblib
+    import pandas as pd
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVC
+
+    # Fit on a DataFrame so the model records its column names; the processor
+    # maps them back onto schema positions at load time
+    model = make_pipeline(StandardScaler(), SVC(kernel='rbf', probability=True, class_weight='balanced'))
+    started = time.perf_counter()
+    model.fit(pd.DataFrame(X, columns=feature_names), y)
+    logger.info(f"Trained on {len(feature_names)} features in {time.perf_counter() - started:.2f}s")
+
+    joblib.dump(model, args.output)
+    logger.info(f"Model written to {args.output}")
+
+    if not args.no_compiled:
+        from utils.inference import export_compiled_model
+        export_compiled_model(model, os.path.splitext(args.output)[0] + '.npz')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 # utils/eeg_loader.py - Load various EEG file formats
 import os
+import json
 import logging
+import zipfile
+import numpy as np
 import mne
 
 logger = logging.getLogger('eeg_processor.loader')
@@ -60,23 +63,9 @@ def load_eeg_file(file_path):
             logger.info("Loading as FIF format")
             raw = mne.io.read_raw_fif(file_path, preload=True)
         
-        elif file_ext == '.npy':
+        elif file_ext in ['.npy', '.npz']:
             logger.info("Loading as NumPy array")
-            import numpy as np
-            data = np.load(file_path)
-            
-            # Create MNE Raw object from NumPy array
-            # Assume data shape is (n_channels, n_times)
-            n_channels, n_times = data.shape
-            
-            # Create info structure
-            info = mne.create_info(
-                ch_names=[f"ch{i}" for i in range(n_channels)],
-                sfreq=250,  # Default sampling rate, should be provided for real data
-                ch_types=['eeg'] * n_channels
-            )
-            
-            raw = mne.io.RawArray(data, info)
+            raw = load_numpy_eeg(file_path)
         
         else:
             # Try to auto-detect format
@@ -91,6 +80,130 @@ def load_eeg_file(file_path):
         logger.error(f"Error loading EEG file: {str(e)}")
         raise ValueError(f"Error loading EEG file: {str(e)}")
 
+# Scale factors from sidecar units to volts, the unit MNE expects for EEG
+UNIT_SCALES = {
+    'V': 1.0,
+    'mV': 1e-3,
+    'uV': 1e-6,
+    '\u00b5V': 1e-6,
+    '\u03bcV': 1e-6,
+    'nV': 1e-9
+}
+
+def load_numpy_eeg(file_path):
+    """
+    Load a .npy or .npz recording with its JSON sidecar
+
+    The array is memory-mapped, so pages are only read as MNE touches them.
+    Arrays stored as C-ordered float64 in volts are wrapped by RawArray without
+    a copy; other dtypes or units are converted once.
+
+    The sidecar has the same name with a .json extension (rec.npy -> rec.json)
+    and may contain:
+    
+    sfreq (float): Sampling rate in Hz
+    ch_names (list): Channel names, e.g. standard 10-20 labels
+    ch_types (str or list): MNE channel type for all channels or per channel, default "eeg"
+    units (str or list): V, mV, uV or nV for all channels or per channel, default "V"
+    layout (str): "channels_first" (default) or "times_first"
+    
+    A .npz may instead carry the same keys as arrays next to a "data" array;
+    the sidecar wins where both are given.
+    
+    Parameters:
+    file_path (str): Path to the .npy or .npz file
+
+    Returns:
+    mne.io.RawArray: MNE Raw object backed by the mapped array
+    """
+    metadata = {}
+    
+    if zipfile.is_zipfile(file_path):
+        data, metadata = _load_npz(file_path)
+    else:
+        data = np.load(file_path, mmap_mode='c')
+    
+    sidecar_path = os.path.splitext(file_path)[0] + '.json'
+    if os.path.exists(sidecar_path):
+        with open(sidecar_path) as sidecar:
+            metadata.update(json.load(sidecar))
+    else:
+        logger.info(f"No sidecar found for {file_path}")
+    
+    if data.ndim != 2:
+        raise ValueError(f"Expected a 2D array, got shape {data.shape}")
+    if metadata.get('layout', 'channels_first') == 'times_first':
+        data = data.T
+    n_channels = data.shape[0]
+    
+    sfreq = metadata.get('sfreq')
+    if sfreq is None:
+        logger.warning("No sampling rate in sidecar, assuming 250 Hz")
+        sfreq = 250
+    
+    ch_names = metadata.get('ch_names') or [f"ch{i}" for i in range(n_channels)]
+    if len(ch_names) != n_channels:
+        raise ValueError(f"Sidecar lists {len(ch_names)} channels but the array has {n_channels}")
+    
+    ch_types = metadata.get('ch_types', 'eeg')
+    if isinstance(ch_types, str):
+        ch_types = [ch_types] * n_channels
+    
+    # Convert to volts only when needed, so float64 volt arrays stay mapped
+    units = metadata.get('units', 'V')
+    if isinstance(units, str):
+        units = [units] * n_channels
+    try:
+        scales = np.array([UNIT_SCALES[unit] for unit in units])
+    except KeyError as e:
+        raise ValueError(f"Unsupported unit in sidecar: {e.args[0]}")
+    if not np.all(scales == 1.0):
+        data = data * scales[:, np.newaxis]
+    
+    info = mne.create_info(ch_names=list(ch_names), sfreq=float(sfreq), ch_types=list(ch_types))
+    return mne.io.RawArray(data, info, verbose=False)
+
+def _load_npz(file_path):
+    """
+    Read the "data" array of an .npz, memory-mapping it if it is stored
+    uncompressed, plus any metadata arrays stored alongside it
+    """
+    metadata = {}
+    with np.load(file_path) as npz:
+        for key in ('sfreq', 'ch_names', 'ch_types', 'units', 'layout'):
+            if key in npz.files:
+                value = npz[key]
+                metadata[key] = value.item() if value.ndim == 0 else value.tolist()
+        if 'data' not in npz.files:
+            raise ValueError(f"No 'data' array in {file_path}")
+    
+    with zipfile.ZipFile(file_path) as archive:
+        member = archive.getinfo('data.npy')
+    
+    if member.compress_type != zipfile.ZIP_STORED:
+        # Compressed members have to be inflated into memory
+        with np.load(file_path) as npz:
+            return npz['data'], metadata
+    
+    with open(file_path, 'rb') as f:
+        # Skip the member's local file header to reach the embedded .npy
+        f.seek(member.header_offset)
+        header = f.read(30)
+        name_length = int.from_bytes(header[26:28], 'little')
+        extra_length = int.from_bytes(header[28:30], 'little')
+        f.seek(member.header_offset + 30 + name_length + extra_length)
+        
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    
+    data = np.memmap(file_path, dtype=dtype, mode='c', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+    return data, metadata
+
 def extract_bids_info_from_filename(filename):
     """
     Extract BIDS information from filename
@@ -3,6 +3,15 @@ import numpy as np
 from scipy import signal
 import mne
 
+# Define frequency bands
+FREQUENCY_BANDS = {
+    'delta': (0.5, 4),
+    'theta': (4, 8),
+    'alpha': (8, 13),
+    'beta': (13, 30),
+    'gamma': (30, 50)
+}
+
 def extract_features_for_adhd(raw):
     """
     Extract features from EEG data for ADHD detection
@@ -14,34 +23,49 @@ def extract_features_for_adhd(raw):
     Returns:
     dict: Dictionary of features
     """
-    # Define frequency bands
-    bands = {
-        'delta': (0.5, 4),
-        'theta': (4, 8),
-        'alpha': (8, 13),
-        'beta': (13, 30),
-        'gamma': (30, 50)
-    }
-    
     # Filter EEG channels only
     picks = mne.pick_types(raw.info, eeg=True, exclude='bads')
     
     # Calculate power spectral density
-    psd, freqs = mne.time_frequency.psd_welch(
-        raw, 
-        fmin=0.5, 
-        fmax=50, 
-        picks=picks, 
+    welch_params = dict(
+        fmin=0.5,
+        fmax=50,
+        picks=picks,
         n_fft=int(raw.info['sfreq'] * 2),  # 2-second window
         n_overlap=int(raw.info['sfreq']),  # 50% overlap
         n_per_seg=int(raw.info['sfreq'] * 2)
     )
+    if hasattr(raw, 'compute_psd'):
+        # psd_welch was removed in MNE 1.4 in favour of the Spectrum API
+        psd, freqs = raw.compute_psd(method='welch', verbose=False, **welch_params).get_data(return_freqs=True)
+    else:
+        psd, freqs = mne.time_frequency.psd_welch(raw, **welch_params)
+    
+    return features_from_psd(psd, freqs, np.array(raw.ch_names)[picks])
+
+def features_from_psd(psd, freqs, ch_names):
+    """
+    Compute ADHD features from a per-channel power spectral density
+
+    Shared by the batch path and the streaming analyzer, which maintains its
+    own running PSD.
+
+    Parameters:
+    psd (np.ndarray): PSD of shape (n_channels, n_freqs)
+    freqs (np.ndarray): Frequencies of the PSD bins in Hz
+    ch_names (list): Channel names matching the rows of psd
+
+    Returns:
+    dict: Dictionary of features
+    """
+    bands = FREQUENCY_BANDS
+    ch_names = np.asarray(ch_names)
     
     # Extract band powers
     features = {}
     
     # For each channel
-    for ch_idx, ch_name in enumerate(np.array(raw.ch_names)[picks]):
+    for ch_idx, ch_name in enumerate(ch_names):
         ch_psd = psd[ch_idx]
         
         # For each frequency band
@@ -58,7 +82,7 @@ def extract_features_for_adhd(raw):
     # Calculate common ADHD-relevant features
     
     # 1. Theta/Beta ratio (a common biomarker in ADHD research)
-    for ch_idx, ch_name in enumerate(np.array(raw.ch_names)[picks]):
+    for ch_idx, ch_name in enumerate(ch_names):
         theta_power = features.get(f'{ch_name}_theta', 0)
         beta_power = features.get(f'{ch_name}_beta', 0)
         
@@ -67,7 +91,7 @@ def extract_features_for_adhd(raw):
     
     # 2. Frontal asymmetry (relevant for emotional regulation in ADHD)
     # Find frontal channels
-    frontal_channels = [ch for ch in np.array(raw.ch_names)[picks] 
+    frontal_channels = [ch for ch in ch_names 
                       if ch.startswith('F') or ch.startswith('Fp')]
     
     # Calculate alpha asymmetry if frontal channels are available
@@ -100,15 +124,15 @@ def extract_features_for_adhd(raw):
     # 5. Region-specific features
     # Define regions
     regions = {
-        'frontal': [ch for ch in np.array(raw.ch_names)[picks] 
+        'frontal': [ch for ch in ch_names 
                   if ch.startswith('F') or ch.startswith('Fp')],
-        'central': [ch for ch in np.array(raw.ch_names)[picks] 
+        'central': [ch for ch in ch_names 
                   if ch.startswith('C')],
-        'temporal': [ch for ch in np.array(raw.ch_names)[picks] 
+        'temporal': [ch for ch in ch_names 
                    if ch.startswith('T')],
-        'parietal': [ch for ch in np.array(raw.ch_names)[picks] 
+        'parietal': [ch for ch in ch_names 
                    if ch.startswith('P')],
-        'occipital': [ch for ch in np.array(raw.ch_names)[picks] 
+        'occipital': [ch for ch in ch_names 
                     if ch.startswith('O')]
     }
     
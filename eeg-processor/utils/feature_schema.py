@@ -0,0 +1,181 @@
+# utils/feature_schema.py - Fixed, versioned layout for ADHD feature vectors
+import re
+import numpy as np
+
+FEATURE_SCHEMA_VERSION = 1
+
+# Frequency bands, in the order used by extract_features_for_adhd
+BANDS = ['delta', 'theta', 'alpha', 'beta', 'gamma']
+
+# Scalp regions, in the order used by extract_features_for_adhd
+REGIONS = ['frontal', 'central', 'temporal', 'parietal', 'occipital']
+
+# International 10-20 montage. Per-channel features are only kept for these
+# channels; other channels still contribute to the global and regional features.
+STANDARD_CHANNELS = [
+    'Fp1', 'Fp2', 'F7', 'F3', 'Fz', 'F4', 'F8',
+    'T7', 'C3', 'Cz', 'C4', 'T8',
+    'P7', 'P3', 'Pz', 'P4', 'P8',
+    'O1', 'O2'
+]
+
+# Old 10-20 names for channels renamed in the modified combinatorial nomenclature
+CHANNEL_ALIASES = {'T3': 'T7', 'T4': 'T8', 'T5': 'P7', 'T6': 'P8'}
+
+# Recorder decorations around the electrode name, e.g. "EEG Fp1-REF" or "FP1-A1"
+_CHANNEL_PREFIX = re.compile(r'^EEG[\s_:-]*', re.IGNORECASE)
+_CHANNEL_REFERENCE = re.compile(r'[\s_-]+(REF|LE|RE|AR|AVG|A1|A2|M1|M2|A1A2|M1M2)$', re.IGNORECASE)
+_STANDARD_LOOKUP = {ch.upper(): ch for ch in STANDARD_CHANNELS}
+_STANDARD_LOOKUP.update({old.upper(): new for old, new in CHANNEL_ALIASES.items()})
+
+# Vectors are stored little-endian regardless of the host
+_STORAGE_DTYPE = np.dtype('<f4')
+
+
+def standard_channel_names(ch_names):
+    """
+    Map recorder channel labels onto STANDARD_CHANNELS names
+
+    Strips "EEG" prefixes and reference suffixes, fixes case and translates old
+    10-20 names (T3/T4/T5/T6). Labels that do not match, or whose standard name
+    is already taken by another channel, are left alone.
+
+    Parameters:
+    ch_names (list): Channel names as recorded
+
+    Returns:
+    dict: Old name to standard name, only for channels that need renaming
+    """
+    taken = set(ch_names)
+    mapping = {}
+    for name in ch_names:
+        label = _CHANNEL_REFERENCE.sub('', _CHANNEL_PREFIX.sub('', name.strip()))
+        standard = _STANDARD_LOOKUP.get(label.upper())
+        if standard is None or standard == name or standard in taken:
+            continue
+        mapping[name] = standard
+        taken.add(standard)
+    return mapping
+
+
+def _feature_names_v1():
+    names = []
+    for ch in STANDARD_CHANNELS:
+        names.extend(f'{ch}_{band}' for band in BANDS)
+    names.extend(f'{ch}_theta_beta_ratio' for ch in STANDARD_CHANNELS)
+    names.append('frontal_alpha_asymmetry')
+    names.extend(f'global_{band}' for band in BANDS)
+    names.append('global_theta_beta_ratio')
+    for region in REGIONS:
+        names.extend(f'{region}_{band}' for band in BANDS)
+        names.append(f'{region}_theta_beta_ratio')
+    names.extend(f'global_{band}_norm' for band in BANDS)
+    return names
+
+
+class FeatureSchema:
+    """
+    Ordered feature names with an index, mapping feature dicts to float32 vectors
+
+    Features missing from a recording are stored as NaN.
+
+    Parameters:
+    names (list): Feature names in vector order
+    version (int): Schema version stored next to every encoded vector
+    """
+
+    def __init__(self, names, version):
+        self.names = tuple(names)
+        self.version = version
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def vectorize(self, features):
+        """
+        Parameters:
+        features (dict): Feature name to value, as returned by extract_features_for_adhd
+
+        Returns:
+        np.ndarray: float32 vector in schema order
+        """
+        vector = np.full(len(self.names), np.nan, dtype=np.float32)
+        for name, value in features.items():
+            i = self.index.get(name)
+            if i is not None:
+                vector[i] = value
+        return vector
+
+    def missing(self, vector):
+        """Names of the features that are NaN in a vector"""
+        return [self.names[i] for i in np.flatnonzero(np.isnan(vector))]
+
+    def get(self, vector, name, default=None):
+        """Look up one feature by name, returning default if it is missing or NaN"""
+        i = self.index.get(name)
+        if i is None or np.isnan(vector[i]):
+            return default
+        return float(vector[i])
+
+    def column_indices(self, columns):
+        """
+        Map model column names onto vector positions
+
+        Parameters:
+        columns (list): Feature names in the order the model expects them
+
+        Returns:
+        np.ndarray: Indices such that vector[indices] matches the model's columns
+
+        Raises:
+        ValueError: If the model uses features this schema does not provide
+        """
+        missing = [name for name in columns if name not in self.index]
+        if missing:
+            raise ValueError(f"Model expects features not in schema v{self.version}: {missing[:5]}")
+        return np.array([self.index[name] for name in columns], dtype=np.intp)
+
+    def encode(self, vector):
+        """
+        Returns:
+        dict: Document fragment holding the schema version and the raw vector bytes
+        """
+        return {
+            'schema_version': self.version,
+            'vector': np.asarray(vector, dtype=_STORAGE_DTYPE).tobytes()
+        }
+
+    def decode(self, encoded):
+        """
+        Parameters:
+        encoded (dict): Fragment produced by encode()
+
+        Returns:
+        np.ndarray: float32 vector in schema order
+        """
+        if encoded.get('schema_version') != self.version:
+            raise ValueError(f"Expected feature schema v{self.version}, got v{encoded.get('schema_version')}")
+        return np.frombuffer(encoded['vector'], dtype=_STORAGE_DTYPE).astype(np.float32)
+
+
+DEFAULT_SCHEMA = FeatureSchema(_feature_names_v1(), FEATURE_SCHEMA_VERSION)
+
+# All schema versions this service can read, for documents written by older releases
+SCHEMAS = {DEFAULT_SCHEMA.version: DEFAULT_SCHEMA}
+
+
+def get_schema(version):
+    """
+    Parameters:
+    version (int): Schema version stored with a vector
+
+    Returns:
+    FeatureSchema: The matching schema
+
+    Raises:
+    ValueError: If the version is unknown
+    """
+    if version not in SCHEMAS:
+        raise ValueError(f"Unknown feature schema version: {version}")
+    return SCHEMAS[version]
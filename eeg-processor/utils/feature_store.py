@@ -0,0 +1,276 @@
+# utils/feature_store.py - Partitioned Parquet store of extracted feature vectors
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils.feature_schema import DEFAULT_SCHEMA, get_schema
+
+logger = logging.getLogger('eeg_processor.feature_store')
+
+# Per-recording columns stored next to the features, in column order
+METADATA_FIELDS = [
+    ('eeg_id', pa.string()),
+    ('patient_id', pa.string()),
+    ('group', pa.string()),
+    ('sub', pa.string()),
+    ('ses', pa.string()),
+    ('task', pa.string()),
+    ('run', pa.string()),
+    ('result', pa.string()),
+    ('confidence', pa.float32()),
+    ('performed_at', pa.timestamp('ms'))
+]
+
+# Hive-style partition columns, encoded in the directory names
+PARTITIONING = ds.partitioning(
+    pa.schema([('schema_version', pa.int32()), ('date', pa.string())]),
+    flavor='hive'
+)
+
+
+def _coerce(value, dtype):
+    """Stringify metadata bound for string columns, e.g. numeric patient IDs"""
+    if value is not None and pa.types.is_string(dtype):
+        return str(value)
+    return value
+
+
+def arrow_schema(feature_schema):
+    """
+    Parameters:
+    feature_schema (FeatureSchema): Layout of the feature vectors
+
+    Returns:
+    pyarrow.Schema: File schema with metadata columns then one float32 column per feature
+    """
+    fields = [pa.field(name, dtype) for name, dtype in METADATA_FIELDS]
+    fields.extend(pa.field(name, pa.float32()) for name in feature_schema.names)
+    return pa.schema(fields)
+
+
+class FeatureStore:
+    """
+    Append-only columnar store of feature vectors, partitioned by schema
+    version and analysis date
+
+    Rows are buffered in memory and written as one Parquet file per flush,
+    so appends never rewrite existing files. The service flushes after every
+    batch, so once a partition holds compact_files files a flush merges them
+    into one; reads slow down by orders of magnitude with thousands of tiny
+    files. Reads go through pyarrow.dataset, which prunes partitions and row
+    groups from filters and only decodes the requested columns.
+
+    Parameters:
+    root (str): Directory holding the partitioned dataset
+    flush_rows (int): Buffered rows that trigger an automatic flush
+    compact_files (int): Files in a partition that trigger compaction after a flush, 0 to disable
+    """
+
+    def __init__(self, root, flush_rows=1000, compact_files=32):
+        self.root = root
+        self.flush_rows = flush_rows
+        self.compact_files = compact_files
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def append(self, metadata, vector, schema_version=DEFAULT_SCHEMA.version):
+        """
+        Buffer one feature vector
+
+        Parameters:
+        metadata (dict): Values for METADATA_FIELDS; missing keys are stored as null
+        vector (np.ndarray): float32 feature vector in schema order
+        schema_version (int): Version of the schema the vector was encoded with
+        """
+        with self._lock:
+            self._buffer.append((schema_version, metadata, np.asarray(vector, dtype=np.float32)))
+            if len(self._buffer) >= self.flush_rows:
+                self._flush_locked()
+
+    def flush(self):
+        """Write buffered rows to new Parquet files"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+
+        # Take the rows out first so a failing write can never wedge the buffer
+        buffered, self._buffer = self._buffer, []
+
+        # One file per (schema version, date) partition
+        partitions = {}
+        for schema_version, metadata, vector in buffered:
+            performed_at = metadata.get('performed_at') or datetime.now()
+            key = (schema_version, performed_at.strftime('%Y-%m-%d'))
+            partitions.setdefault(key, []).append((dict(metadata, performed_at=performed_at), vector))
+
+        for (schema_version, date), rows in partitions.items():
+            try:
+                feature_schema = get_schema(schema_version)
+                table = self._table(feature_schema, rows)
+            except Exception as e:
+                # Keep the rows that convert; drop the ones that do not
+                logger.error(f"Could not convert {len(rows)} feature rows for {date}: {str(e)}")
+                table = self._table_skipping_bad_rows(schema_version, rows)
+                if table is None:
+                    continue
+
+            partition_dir = os.path.join(self.root, f"schema_version={schema_version}", f"date={date}")
+            file_name = f"part-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+            try:
+                os.makedirs(partition_dir, exist_ok=True)
+                pq.write_table(table, os.path.join(partition_dir, file_name))
+            except Exception as e:
+                eeg_ids = table.column('eeg_id').to_pylist()
+                logger.error(f"Dropped {table.num_rows} feature rows for {partition_dir}: {str(e)} (EEG IDs: {eeg_ids})")
+                continue
+            logger.info(f"Wrote {table.num_rows} feature rows to {partition_dir}")
+
+            if self.compact_files and len(_parquet_files(partition_dir)) >= self.compact_files:
+                try:
+                    self._compact_partition_locked(partition_dir)
+                except Exception as e:
+                    # The appended files are intact; compaction is retried after the next flush
+                    logger.error(f"Could not compact {partition_dir}: {str(e)}")
+
+    def _table(self, feature_schema, rows):
+        """Build the Arrow table for one partition's rows"""
+        matrix = np.vstack([vector for _, vector in rows])
+        columns = [
+            pa.array([_coerce(metadata.get(name), dtype) for metadata, _ in rows], type=dtype)
+            for name, dtype in METADATA_FIELDS
+        ]
+        columns.extend(pa.array(matrix[:, i]) for i in range(len(feature_schema)))
+        return pa.Table.from_arrays(columns, schema=arrow_schema(feature_schema))
+
+    def _table_skipping_bad_rows(self, schema_version, rows):
+        """Convert rows one by one, logging and dropping those that fail"""
+        try:
+            feature_schema = get_schema(schema_version)
+        except ValueError as e:
+            logger.error(f"Dropped {len(rows)} feature rows: {str(e)}")
+            return None
+
+        tables = []
+        for metadata, vector in rows:
+            try:
+                tables.append(self._table(feature_schema, [(metadata, vector)]))
+            except Exception as e:
+                logger.error(f"Dropped feature row for EEG {metadata.get('eeg_id')}: {str(e)}")
+        return pa.concat_tables(tables) if tables else None
+
+    def dataset(self):
+        """
+        Returns:
+        pyarrow.dataset.Dataset: The whole store, or None if nothing was written yet
+        """
+        if not os.path.isdir(self.root):
+            return None
+        return ds.dataset(self.root, format='parquet', partitioning=PARTITIONING)
+
+    def read(self, columns=None, filter=None, schema_version=DEFAULT_SCHEMA.version):
+        """
+        Read a column subset of the rows matching a predicate
+
+        Parameters:
+        columns (list): Column names to read, or None for all
+        filter (pyarrow.compute.Expression): Row predicate, e.g. ds.field('task') == 'rest'
+        schema_version (int): Schema version partition to read
+
+        Returns:
+        pyarrow.Table: Matching rows
+        """
+        dataset = self.dataset()
+        if dataset is None:
+            empty = arrow_schema(get_schema(schema_version)).empty_table()
+            return empty.select(columns) if columns else empty
+
+        predicate = ds.field('schema_version') == schema_version
+        if filter is not None:
+            predicate = predicate & filter
+        return dataset.to_table(columns=columns, filter=predicate)
+
+    def load_matrix(self, feature_names=None, metadata_columns=('eeg_id',), filter=None,
+                    schema_version=DEFAULT_SCHEMA.version, latest_only=True):
+        """
+        Load features as a dense matrix for training or cohort statistics
+
+        A recording analysed more than once (a re-analysis, or a streaming
+        result followed by a batch run) has one row per analysis; by default
+        only the most recent one is returned.
+
+        Parameters:
+        feature_names (list): Features to load, or None for the whole schema
+        metadata_columns (tuple): Metadata columns returned alongside the matrix
+        filter (pyarrow.compute.Expression): Row predicate
+        schema_version (int): Schema version partition to read
+        latest_only (bool): Keep only the latest row per eeg_id
+
+        Returns:
+        tuple: (float32 matrix of shape (rows, features), pyarrow.Table of metadata columns)
+        """
+        feature_names = list(feature_names or get_schema(schema_version).names)
+        metadata_columns = list(metadata_columns)
+        extra = [name for name in ('eeg_id', 'performed_at') if latest_only and name not in metadata_columns]
+        table = self.read(metadata_columns + extra + feature_names, filter, schema_version)
+        if latest_only:
+            table = _latest_per_recording(table)
+
+        # Fill a column-major matrix one column at a time to avoid a row-wise copy
+        matrix = np.empty((table.num_rows, len(feature_names)), dtype=np.float32, order='F')
+        for i, name in enumerate(feature_names):
+            matrix[:, i] = table.column(name).to_numpy()
+        return matrix, table.select(metadata_columns)
+
+    def compact(self, schema_version=DEFAULT_SCHEMA.version):
+        """
+        Merge each date partition's small append files into a single file
+
+        Parameters:
+        schema_version (int): Schema version partition to compact
+        """
+        version_dir = os.path.join(self.root, f"schema_version={schema_version}")
+        if not os.path.isdir(version_dir):
+            return
+
+        with self._lock:
+            for partition in sorted(os.listdir(version_dir)):
+                partition_dir = os.path.join(version_dir, partition)
+                if len(_parquet_files(partition_dir)) >= 2:
+                    self._compact_partition_locked(partition_dir)
+
+    def _compact_partition_locked(self, partition_dir):
+        parts = _parquet_files(partition_dir)
+        table = pa.concat_tables(pq.read_table(os.path.join(partition_dir, f)) for f in parts)
+        merged = f"part-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp_path = os.path.join(partition_dir, f".{merged}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(partition_dir, merged))
+        for f in parts:
+            os.remove(os.path.join(partition_dir, f))
+        logger.info(f"Compacted {len(parts)} files ({table.num_rows} rows) in {partition_dir}")
+
+
+def _parquet_files(partition_dir):
+    return sorted(f for f in os.listdir(partition_dir) if f.endswith('.parquet'))
+
+
+def _latest_per_recording(table):
+    """Keep the row with the latest performed_at for each eeg_id"""
+    if table.num_rows == 0:
+        return table
+    order = pc.sort_indices(table, sort_keys=[('eeg_id', 'ascending'), ('performed_at', 'descending')])
+    eeg_ids = table.column('eeg_id').take(order).to_numpy(zero_copy_only=False)
+    first = np.ones(len(eeg_ids), dtype=bool)
+    first[1:] = eeg_ids[1:] != eeg_ids[:-1]
+    return table.take(order.to_numpy()[first])
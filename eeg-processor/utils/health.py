@@ -0,0 +1,61 @@
+# utils/health.py - Readiness marker shared by the processor and the container healthcheck
+#
+# Run as `python -m utils.health` to check readiness; the exit code is 0 when the
+# processor has finished warming up and has sent a heartbeat recently. This module
+# must stay free of heavy imports so the healthcheck itself is cheap.
+import json
+import os
+import sys
+import time
+
+READY_FILE = os.getenv('READY_FILE', '/tmp/eeg_processor.ready')
+HEARTBEAT_MAX_AGE = float(os.getenv('HEARTBEAT_MAX_AGE', '300'))
+
+
+def mark_ready(report=None):
+    """
+    Record that the service is ready to accept work
+
+    Parameters:
+    report (dict): Startup profile stored in the marker for later inspection
+    """
+    tmp_path = f"{READY_FILE}.tmp"
+    with open(tmp_path, 'w') as ready_file:
+        json.dump({'ready_at': time.time(), 'startup': report or {}}, ready_file, default=str)
+    os.replace(tmp_path, READY_FILE)
+
+
+def heartbeat():
+    """Refresh the marker's modification time if the service is ready"""
+    try:
+        os.utime(READY_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def clear():
+    """Remove a marker left behind by a previous run"""
+    try:
+        os.remove(READY_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def is_ready(max_age=HEARTBEAT_MAX_AGE):
+    """
+    Check the readiness marker
+
+    Parameters:
+    max_age (float): Maximum seconds since the last heartbeat
+
+    Returns:
+    bool: True if the service is warmed up and still alive
+    """
+    try:
+        return time.time() - os.path.getmtime(READY_FILE) <= max_age
+    except OSError:
+        return False
+
+
+if __name__ == "__main__":
+    sys.exit(0 if is_ready() else 1)
@@ -0,0 +1,341 @@
+# utils/inference.py - Inference backends for the ADHD model
+#
+# Run as `python -m utils.inference models/adhd_svm_model.pkl` to export a
+# pickled scaler + SVC pipeline to models/adhd_svm_model.npz.
+import abc
+import os
+import sys
+import logging
+import warnings
+import numpy as np
+
+logger = logging.getLogger('eeg_processor.inference')
+
+COMPILED_MODEL_VERSION = 1
+
+
+class InferenceBackend(abc.ABC):
+    """
+    Interface shared by all model backends
+
+    Attributes:
+    classes_ (np.ndarray): Class labels, in the column order of predict_proba
+    feature_names (list): Feature names the model expects, or None for schema order
+    n_features (int): Number of input features
+    """
+
+    classes_ = None
+    feature_names = None
+    n_features = None
+
+    @classmethod
+    @abc.abstractmethod
+    def load(cls, path):
+        """
+        Parameters:
+        path (str): Model file written for this backend
+
+        Returns:
+        InferenceBackend: The loaded model
+        """
+
+    @abc.abstractmethod
+    def predict(self, X):
+        """
+        Parameters:
+        X (np.ndarray): Feature matrix of shape (n_samples, n_features)
+
+        Returns:
+        np.ndarray: Predicted class labels
+
+        Raises:
+        ValueError: If X contains NaN or infinity
+        """
+
+    @abc.abstractmethod
+    def predict_proba(self, X):
+        """
+        Parameters:
+        X (np.ndarray): Feature matrix of shape (n_samples, n_features)
+
+        Returns:
+        np.ndarray: Class probabilities of shape (n_samples, n_classes)
+
+        Raises:
+        ValueError: If X contains NaN or infinity
+        """
+
+
+class SklearnBackend(InferenceBackend):
+    """Pickled scikit-learn estimator, loaded with joblib"""
+
+    def __init__(self, model):
+        self.model = model
+        self.classes_ = model.classes_
+        names = getattr(model, 'feature_names_in_', None)
+        self.feature_names = list(names) if names is not None else None
+        self.n_features = getattr(model, 'n_features_in_', None)
+
+    @classmethod
+    def load(cls, path):
+        import joblib
+        return cls(joblib.load(path))
+
+    def predict(self, X):
+        # Columns are aligned by name before they get here
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            return self.model.predict(X)
+
+    def predict_proba(self, X):
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            return self.model.predict_proba(X)
+
+
+class CompiledSVMBackend(InferenceBackend):
+    """
+    Binary SVC (with optional StandardScaler) evaluated with NumPy only
+
+    The support vectors are stored pre-scaled, so one kernel evaluation
+    against the standardized input gives the decision function. Probabilities
+    use the same Platt sigmoid as libsvm.
+
+    Parameters:
+    arrays (dict): Arrays written by export_compiled_model
+    """
+
+    def __init__(self, arrays):
+        version = int(arrays['version'])
+        if version != COMPILED_MODEL_VERSION:
+            raise ValueError(f"Unsupported compiled model version: {version}")
+
+        self.classes_ = arrays['classes']
+        self.feature_names = arrays['feature_names'].tolist() if arrays['feature_names'].size else None
+        self.kernel = str(arrays['kernel'])
+        self.gamma = float(arrays['gamma'])
+        self.coef0 = float(arrays['coef0'])
+        self.degree = int(arrays['degree'])
+        self.mean = arrays['scaler_mean']
+        self.scale = arrays['scaler_scale']
+        self.support_vectors = arrays['support_vectors']
+        self.dual_coef = arrays['dual_coef'].ravel()
+        self.intercept = float(arrays['intercept'].ravel()[0])
+        self.prob_a = float(arrays['prob_a'].ravel()[0])
+        self.prob_b = float(arrays['prob_b'].ravel()[0])
+        self.n_features = self.support_vectors.shape[1]
+        self._sv_sq_norms = np.einsum('ij,ij->i', self.support_vectors, self.support_vectors)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            return cls({key: npz[key] for key in npz.files})
+
+    def decision_function(self, X):
+        """Signed distance to the separating surface; positive means classes_[1]"""
+        X = np.asarray(X, dtype=np.float64)
+        # NaN would otherwise come out as a 0.5/0.5 prediction of classes_[0]
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity")
+        X = (X - self.mean) / self.scale
+        dot = X @ self.support_vectors.T
+
+        if self.kernel == 'linear':
+            K = dot
+        elif self.kernel == 'rbf':
+            sq_dist = np.einsum('ij,ij->i', X, X)[:, None] + self._sv_sq_norms[None, :] - 2 * dot
+            K = np.exp(-self.gamma * np.maximum(sq_dist, 0))
+        elif self.kernel == 'poly':
+            K = (self.gamma * dot + self.coef0) ** self.degree
+        elif self.kernel == 'sigmoid':
+            K = np.tanh(self.gamma * dot + self.coef0)
+        else:
+            raise ValueError(f"Unsupported kernel: {self.kernel}")
+
+        return K @ self.dual_coef + self.intercept
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+    def predict_proba(self, X):
+        # libsvm's sigmoid is fitted on its own decision values, which have the
+        # opposite sign to scikit-learn's and give the probability of classes_[0]
+        f_ab = -self.decision_function(X) * self.prob_a + self.prob_b
+        r = np.where(
+            f_ab >= 0,
+            np.exp(-np.abs(f_ab)) / (1 + np.exp(-np.abs(f_ab))),
+            1 / (1 + np.exp(-np.abs(f_ab)))
+        )
+        # libsvm clips pairwise probabilities away from 0 and 1
+        r = np.clip(r, 1e-7, 1 - 1e-7)
+        return _couple_binary(r)
+
+
+def _couple_binary(r, max_iter=100, eps=0.005 / 2):
+    """
+    libsvm's iterative pairwise coupling (multiclass_probability) for two
+    classes, vectorized over samples
+
+    scikit-learn's libsvm runs this even in the binary case and stops at a
+    tolerance, so returning r directly would differ by up to ~0.005.
+
+    Parameters:
+    r (np.ndarray): Pairwise probability of the first class for each sample
+
+    Returns:
+    np.ndarray: Class probabilities of shape (n_samples, 2)
+    """
+    n = r.shape[0]
+    # Q[t][t] = r[j][t]^2 and Q[t][j] = -r[j][t] * r[t][j] for the other class j
+    q_diag = np.column_stack([1 - r, r]) ** 2
+    q_off = -r * (1 - r)
+    # Column t of Q for each sample, used to update Qp after changing p[t]
+    q_cols = [np.column_stack([q_diag[:, 0], q_off]), np.column_stack([q_off, q_diag[:, 1]])]
+    p = np.full((n, 2), 0.5)
+    active = np.ones(n, dtype=bool)
+
+    for _ in range(max_iter):
+        qp = q_diag * p + q_off[:, None] * p[:, ::-1]
+        pqp = np.einsum('ij,ij->i', p, qp)
+        active &= np.abs(qp - pqp[:, None]).max(axis=1) >= eps
+        if not active.any():
+            break
+        # Converged samples get a zero step, which leaves them unchanged
+        for t in range(2):
+            diff = np.where(active, (pqp - qp[:, t]) / q_diag[:, t], 0.0)
+            p[:, t] += diff
+            pqp = (pqp + diff * (diff * q_diag[:, t] + 2 * qp[:, t])) / (1 + diff) ** 2
+            qp = (qp + diff[:, None] * q_cols[t]) / (1 + diff)[:, None]
+            p /= (1 + diff)[:, None]
+
+    return p
+
+
+def export_compiled_model(model, path):
+    """
+    Export a fitted binary SVC, or a pipeline of StandardScaler and SVC, to .npz
+
+    Parameters:
+    model: Fitted sklearn SVC or Pipeline ending in an SVC with probability=True
+    path (str): Output .npz path
+
+    Raises:
+    ValueError: If the model is not a supported scaler + SVC combination
+    """
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVC
+
+    steps = [step for _, step in model.steps] if isinstance(model, Pipeline) else [model]
+    svc = steps[-1]
+    scalers = steps[:-1]
+
+    if not isinstance(svc, SVC):
+        raise ValueError(f"Last step must be an SVC, got {type(svc).__name__}")
+    if len(svc.classes_) != 2:
+        raise ValueError("Only binary SVC models can be compiled")
+    if len(scalers) > 1 or (scalers and not isinstance(scalers[0], StandardScaler)):
+        raise ValueError("Only a single StandardScaler is supported before the SVC")
+    if callable(svc.kernel) or svc.kernel == 'precomputed':
+        raise ValueError(f"Unsupported kernel: {svc.kernel}")
+
+    prob_a = getattr(svc, 'probA_', getattr(svc, '_probA', np.array([])))
+    prob_b = getattr(svc, 'probB_', getattr(svc, '_probB', np.array([])))
+    if len(prob_a) == 0:
+        raise ValueError("SVC must be fitted with probability=True")
+
+    n_features = svc.support_vectors_.shape[1]
+    mean = np.zeros(n_features)
+    scale = np.ones(n_features)
+    if scalers:
+        scaler = scalers[0]
+        if scaler.with_mean:
+            mean = scaler.mean_
+        if scaler.with_std:
+            scale = scaler.scale_
+
+    names = getattr(model, 'feature_names_in_', None)
+    np.savez(
+        path,
+        version=np.array(COMPILED_MODEL_VERSION),
+        classes=np.asarray(svc.classes_).astype(str),
+        feature_names=np.asarray(names if names is not None else [], dtype=str),
+        kernel=np.array(svc.kernel),
+        gamma=np.array(float(svc._gamma)),
+        coef0=np.array(float(svc.coef0)),
+        degree=np.array(int(svc.degree)),
+        scaler_mean=np.asarray(mean, dtype=np.float64),
+        scaler_scale=np.asarray(scale, dtype=np.float64),
+        support_vectors=np.asarray(svc.support_vectors_, dtype=np.float64),
+        dual_coef=np.asarray(svc.dual_coef_, dtype=np.float64),
+        intercept=np.asarray(svc.intercept_, dtype=np.float64),
+        prob_a=np.asarray(prob_a, dtype=np.float64),
+        prob_b=np.asarray(prob_b, dtype=np.float64)
+    )
+    logger.info(f"Compiled model with {len(svc.support_vectors_)} support vectors written to {path}")
+
+
+def model_path(model_dir, name='adhd_svm_model', backend=None):
+    """
+    Pick the model file to serve
+
+    In "auto" mode the compiled model is preferred unless the pickle is newer,
+    which means it was retrained without re-exporting. Called on every
+    prediction to notice new model files, so it does not log.
+
+    Parameters:
+    model_dir (str): Directory holding <name>.npz and/or <name>.pkl
+    name (str): Model file name without extension
+    backend (str): "compiled", "sklearn" or None/"auto" (INFERENCE_BACKEND) to pick whichever exists
+
+    Returns:
+    str: Path of the model file, or None in "auto" mode if there is none
+
+    Raises:
+    FileNotFoundError: If a backend was forced and its model file is missing
+    ValueError: If the backend name is unknown
+    """
+    backend = backend or os.getenv('INFERENCE_BACKEND', 'auto')
+    compiled_path = os.path.join(model_dir, f'{name}.npz')
+    pickled_path = os.path.join(model_dir, f'{name}.pkl')
+    has_compiled = os.path.exists(compiled_path)
+    has_pickled = os.path.exists(pickled_path)
+
+    if backend in ('compiled', 'sklearn'):
+        # A forced backend without its file is a deployment mistake, not a missing model
+        path = compiled_path if backend == 'compiled' else pickled_path
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"INFERENCE_BACKEND={backend} but {path} does not exist")
+        return path
+    if backend != 'auto':
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if has_compiled and has_pickled and os.path.getmtime(pickled_path) > os.path.getmtime(compiled_path):
+        return pickled_path
+    if has_compiled:
+        return compiled_path
+    return pickled_path if has_pickled else None
+
+
+def load_backend(path):
+    """
+    Parameters:
+    path (str): A .npz compiled model or a .pkl sklearn model
+
+    Returns:
+    InferenceBackend: The loaded model
+    """
+    if path.endswith('.npz'):
+        return CompiledSVMBackend.load(path)
+    return SklearnBackend.load(path)
+
+
+if __name__ == "__main__":
+    import joblib
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m utils.inference <model.pkl> [<model.npz>]")
+        sys.exit(2)
+    source = sys.argv[1]
+    target = sys.argv[2] if len(sys.argv) == 3 else os.path.splitext(source)[0] + '.npz'
+    export_compiled_model(joblib.load(source), target)
@@ -0,0 +1,273 @@
+# utils/pipeline.py - Staged fetch / compute / write pipeline for batch processing
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger('eeg_processor.pipeline')
+
+# Sentinel marking the end of a stage's output
+_DONE = object()
+
+# Upper bound on the default worker count; every worker holds MNE and a recording in memory
+DEFAULT_MAX_WORKERS = 4
+
+
+def default_workers(max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Number of worker processes to use when none is configured
+
+    Uses the container's CPU quota (cgroup v2 or v1) and the process' CPU
+    affinity rather than the host's CPU count, capped at max_workers.
+
+    Parameters:
+    max_workers (int): Upper bound on the result
+
+    Returns:
+    int: At least 1
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else multiprocessing.cpu_count()
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, min(cpus, max_workers))
+
+
+def _cgroup_cpu_quota():
+    """CPUs allowed by the cgroup CPU quota, or None if there is no quota"""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def _timed_call(fn, payload):
+    """Run fn(payload) in a worker process and return (result, elapsed seconds)"""
+    started = time.perf_counter()
+    result = fn(payload)
+    return result, time.perf_counter() - started
+
+
+def _noop():
+    return None
+
+
+class StageStats:
+    """Busy time and item counters for one pipeline stage"""
+
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def record(self, elapsed, ok=True):
+        self.busy_seconds += elapsed
+        if ok:
+            self.items += 1
+        else:
+            self.errors += 1
+
+    def report(self, wall_seconds):
+        capacity = wall_seconds * self.workers
+        return {
+            'items': self.items,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'utilization': round(self.busy_seconds / capacity, 3) if capacity > 0 else 0.0
+        }
+
+
+class EEGPipeline:
+    """
+    Three-stage pipeline overlapping database I/O with CPU-bound signal processing
+
+    A fetch thread prefetches up to `prefetch` payloads into a bounded queue, the
+    calling thread dispatches them to a process pool, and a write thread stores
+    the results in submission order. The write queue bounds the number of
+    recordings in flight, so memory stays flat however long the batch is.
+
+    Parameters:
+    fetch_fn (callable): fetch_fn(key) -> payload, or None to skip the key
+    process_fn (callable): Picklable, module-level process_fn(payload) -> result
+    write_fn (callable): write_fn(key, result), called on the write thread
+    error_fn (callable): error_fn(key, exception) for failures in fetch or process
+    retry_fn (callable): retry_fn(key, suspect) for recordings lost to a broken pool;
+        defaults to reporting them through error_fn
+    workers (int): Number of worker processes for the CPU stage, default_workers() if not set
+    prefetch (int): Maximum number of fetched payloads waiting for a worker
+    write_queue_size (int): Maximum number of results waiting to be written
+    initializer (callable): Picklable function run once in each worker on startup
+    """
+
+    def __init__(self, fetch_fn, process_fn, write_fn, error_fn, retry_fn=None, workers=None,
+                 prefetch=4, write_queue_size=None, initializer=None):
+        self.fetch_fn = fetch_fn
+        self.process_fn = process_fn
+        self.write_fn = write_fn
+        self.error_fn = error_fn
+        self.retry_fn = retry_fn
+        self.workers = workers or default_workers()
+        self.prefetch = max(1, prefetch)
+        self.write_queue_size = write_queue_size or self.workers * 2
+        # Spawn rather than fork so workers never inherit the parent's MongoDB sockets
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=initializer
+        )
+        self.broken = False
+
+    def start(self):
+        """
+        Spawn every worker process and wait for their initializers to finish
+
+        Workers are otherwise spawned on demand, which would put their import
+        and warm-up cost on the first batch.
+        """
+        futures = [self.executor.submit(_noop) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def run(self, keys):
+        """
+        Push every key through the pipeline and wait for all writes to finish
+
+        Parameters:
+        keys (iterable): Keys to process, consumed lazily by the fetch thread
+
+        Returns:
+        dict: Per-stage utilization report plus the batch wall time
+        """
+        fetch_queue = queue.Queue(maxsize=self.prefetch)
+        write_queue = queue.Queue(maxsize=self.write_queue_size)
+        stats = {
+            'fetch': StageStats('fetch'),
+            'process': StageStats('process', workers=self.workers),
+            'write': StageStats('write')
+        }
+
+        started = time.perf_counter()
+        stop = threading.Event()
+        fetcher = threading.Thread(
+            target=self._fetch_stage, args=(keys, fetch_queue, stats['fetch'], stop),
+            name='eeg-pipeline-fetch', daemon=True
+        )
+        writer = threading.Thread(
+            target=self._write_stage, args=(write_queue, stats),
+            name='eeg-pipeline-write', daemon=True
+        )
+        fetcher.start()
+        writer.start()
+
+        try:
+            # Dispatch stage: hand fetched payloads to the process pool
+            broken_error = None
+            while True:
+                entry = fetch_queue.get()
+                if entry is _DONE:
+                    break
+                key, payload, error = entry
+                if error is None and broken_error is None:
+                    try:
+                        future = self.executor.submit(_timed_call, self.process_fn, payload)
+                        write_queue.put((key, future, None))
+                        continue
+                    except BrokenProcessPool as e:
+                        logger.error(f"Worker pool is broken, abandoning the rest of the batch: {str(e)}")
+                        self.broken = True
+                        broken_error = e
+                        stop.set()
+                # Fetch failures, and everything fetched after the pool broke
+                write_queue.put((key, None, error or broken_error))
+        finally:
+            write_queue.put(_DONE)
+            stop.set()
+            # Unblock the fetcher if dispatch stopped before it finished
+            while fetcher.is_alive():
+                try:
+                    fetch_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            fetcher.join()
+            writer.join()
+
+        wall_seconds = time.perf_counter() - started
+        report = {name: stage.report(wall_seconds) for name, stage in stats.items()}
+        report['wall_seconds'] = round(wall_seconds, 3)
+        return report
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self.executor.shutdown(wait=True)
+
+    def _fetch_stage(self, keys, fetch_queue, stats, stop):
+        try:
+            for key in keys:
+                if stop.is_set():
+                    break
+                fetch_started = time.perf_counter()
+                try:
+                    payload = self.fetch_fn(key)
+                except Exception as e:
+                    stats.record(time.perf_counter() - fetch_started, ok=False)
+                    fetch_queue.put((key, None, e))
+                    continue
+                stats.record(time.perf_counter() - fetch_started)
+                if payload is not None:
+                    fetch_queue.put((key, payload, None))
+        except Exception as e:
+            # The key iterator itself failed (e.g. a dropped cursor)
+            logger.error(f"Fetch stage stopped early: {str(e)}")
+        finally:
+            fetch_queue.put(_DONE)
+
+    def _write_stage(self, write_queue, stats):
+        while True:
+            entry = write_queue.get()
+            if entry is _DONE:
+                break
+            key, future, error = entry
+            result = None
+
+            if future is not None:
+                try:
+                    result, elapsed = future.result()
+                    stats['process'].record(elapsed)
+                except BrokenProcessPool as e:
+                    stats['process'].errors += 1
+                    self.broken = True
+                    error = e
+                except Exception as e:
+                    stats['process'].errors += 1
+                    error = e
+
+            write_started = time.perf_counter()
+            try:
+                if isinstance(error, BrokenProcessPool) and self.retry_fn is not None:
+                    # Submitted recordings may have killed the worker; the rest never ran
+                    self.retry_fn(key, future is not None)
+                elif error is not None:
+                    self.error_fn(key, error)
+                else:
+                    self.write_fn(key, result)
+                stats['write'].record(time.perf_counter() - write_started)
+            except Exception as e:
+                stats['write'].record(time.perf_counter() - write_started, ok=False)
+                logger.error(f"Write stage failed for {key}: {str(e)}")
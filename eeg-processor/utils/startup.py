@@ -0,0 +1,82 @@
+# utils/startup.py - Startup profiling for the EEG processor
+import importlib
+import logging
+import time
+
+logger = logging.getLogger('eeg_processor.startup')
+
+# Heavy dependencies in the order the pipeline first needs them. Shared
+# sub-dependencies are charged to whichever module imports them first.
+# sklearn and joblib are only imported when the pickled model backend is used;
+# pyarrow is only needed in the main process, for the feature store.
+PIPELINE_MODULES = [
+    'numpy',
+    'scipy.signal',
+    'mne',
+    'pyarrow.dataset',
+    'pyarrow.parquet'
+]
+
+
+class StartupProfile:
+    """Wall-clock timings for the phases of service startup"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.imports = {}
+
+    def phase(self, name):
+        """Context manager timing one startup phase"""
+        return _Phase(self, name)
+
+    def profile_imports(self, modules=PIPELINE_MODULES):
+        """
+        Import modules one by one and record how long each took
+
+        For a full per-module breakdown run `python -X importtime processor.py`.
+
+        Parameters:
+        modules (list): Dotted module names to import
+        """
+        for name in modules:
+            started = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                logger.warning(f"Could not import {name}: {str(e)}")
+                continue
+            self.imports[name] = round(time.perf_counter() - started, 3)
+
+    def report(self):
+        """
+        Returns:
+        dict: Import and phase timings plus total seconds since start
+        """
+        return {
+            'imports': dict(self.imports),
+            'phases': dict(self.phases),
+            'total_seconds': round(time.perf_counter() - self.started, 3)
+        }
+
+    def log(self):
+        report = self.report()
+        logger.info(f"Startup finished in {report['total_seconds']}s")
+        for name, seconds in report['imports'].items():
+            logger.info(f"  import {name:<20} {seconds:>8.3f}s")
+        for name, seconds in report['phases'].items():
+            logger.info(f"  phase  {name:<20} {seconds:>8.3f}s")
+
+
+class _Phase:
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profile.phases[self.name] = round(time.perf_counter() - self.started, 3)
+        return False
@@ -0,0 +1,158 @@
+# utils/streaming.py - Incremental band-power analysis for in-progress recordings
+#
+# Chunks of a live or still-uploading recording are pushed as documents in the
+# `eegchunks` collection:
+#
+#   {
+#     "eeg_id": <eegdata _id>,
+#     "seq": 0, 1, 2, ...            # consecutive per recording
+#     "data": <bytes>,               # little-endian float32, (n_channels, n_samples), C order, volts
+#     "n_channels": int,
+#     "sfreq": float,                # required on seq 0
+#     "ch_names": [str, ...],        # required on seq 0
+#     "final": bool                  # true on the last chunk
+#   }
+import logging
+import numpy as np
+from scipy import signal
+
+from utils.feature_extraction import features_from_psd
+from utils.feature_schema import standard_channel_names
+
+logger = logging.getLogger('eeg_processor.streaming')
+
+_CHUNK_DTYPE = np.dtype('<f4')
+
+
+def decode_chunk(chunk):
+    """
+    Parameters:
+    chunk (dict): A document from the eegchunks collection
+
+    Returns:
+    np.ndarray: float64 samples of shape (n_channels, n_samples)
+    """
+    data = np.frombuffer(chunk['data'], dtype=_CHUNK_DTYPE)
+    return data.reshape(int(chunk['n_channels']), -1).astype(np.float64)
+
+
+class StreamingBandPower:
+    """
+    Running Welch PSD of a recording that arrives in chunks
+
+    Mirrors the batch pipeline with causal filters: a notch at the line
+    frequency and its harmonics, a 0.5 - 50 Hz band-pass, amplitude-based bad
+    channel detection, then Welch's method with 2-second Hamming windows and
+    50% overlap. Filter state and the unconsumed tail of the signal are kept
+    between chunks, and each Welch segment is transformed exactly once and
+    added to a running sum, so no sample is ever processed twice.
+
+    Parameters:
+    sfreq (float): Sampling frequency in Hz
+    ch_names (list): Channel names, normalized to standard 10-20 names
+    line_freq (float): Power line frequency for the notch filter
+    min_threshold (float): Lower amplitude bound used for bad channel detection
+    max_threshold (float): Upper amplitude bound used for bad channel detection
+    """
+
+    def __init__(self, sfreq, ch_names, line_freq=50, min_threshold=-150, max_threshold=150):
+        self.sfreq = float(sfreq)
+        renames = standard_channel_names(ch_names)
+        self.ch_names = [renames.get(ch, ch) for ch in ch_names]
+        self.n_samples = 0
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+
+        # Welch parameters, matching extract_features_for_adhd
+        self.n_per_seg = int(self.sfreq * 2)
+        self.step = self.n_per_seg - int(self.sfreq)
+        freqs = np.fft.rfftfreq(self.n_per_seg, 1.0 / self.sfreq)
+        self._freq_mask = np.logical_and(freqs >= 0.5, freqs <= 50)
+        self.freqs = freqs[self._freq_mask]
+
+        n_channels = len(self.ch_names)
+        self._psd_sum = np.zeros((n_channels, self.freqs.size))
+        self._n_segments = 0
+        self._tail = np.empty((n_channels, 0))
+        self._artifact_counts = np.zeros(n_channels, dtype=np.int64)
+
+        # Causal filters: notch harmonics below Nyquist, then band-pass
+        nyquist = self.sfreq / 2
+        sections = []
+        for freq in np.arange(line_freq, nyquist, line_freq):
+            b, a = signal.iirnotch(freq, Q=freq / 2, fs=self.sfreq)
+            sections.append(signal.tf2sos(b, a))
+        if nyquist > 50:
+            sections.append(signal.butter(4, [0.5, 50], btype='bandpass', fs=self.sfreq, output='sos'))
+        else:
+            sections.append(signal.butter(4, 0.5, btype='highpass', fs=self.sfreq, output='sos'))
+        self._sos = np.vstack(sections)
+        self._zi = None
+
+    @property
+    def seconds(self):
+        return self.n_samples / self.sfreq
+
+    def push(self, chunk):
+        """
+        Add a chunk of samples
+
+        Parameters:
+        chunk (np.ndarray): Samples of shape (n_channels, n_samples)
+        """
+        if chunk.shape[0] != len(self.ch_names):
+            raise ValueError(f"Expected {len(self.ch_names)} channels, got {chunk.shape[0]}")
+        if chunk.shape[1] == 0:
+            return
+
+        # Start the filters in steady state for the first sample to avoid a step transient
+        if self._zi is None:
+            self._zi = signal.sosfilt_zi(self._sos)[:, None, :] * chunk[None, :, :1]
+        filtered, self._zi = signal.sosfilt(self._sos, chunk, axis=-1, zi=self._zi)
+        self.n_samples += chunk.shape[1]
+
+        self._artifact_counts += np.sum(
+            np.logical_or(filtered < self.min_threshold, filtered > self.max_threshold), axis=1
+        )
+
+        # Transform every complete segment that has not been seen yet
+        data = np.concatenate([self._tail, filtered], axis=1)
+        n_ready = (data.shape[1] - self.n_per_seg) // self.step + 1 if data.shape[1] >= self.n_per_seg else 0
+        if n_ready > 0:
+            ready = data[:, :(n_ready - 1) * self.step + self.n_per_seg]
+            _, _, spectra = signal.spectrogram(
+                ready, fs=self.sfreq, window='hamming', nperseg=self.n_per_seg,
+                noverlap=self.n_per_seg - self.step, detrend='constant', mode='psd'
+            )
+            self._psd_sum += spectra[:, self._freq_mask, :].sum(axis=-1)
+            self._n_segments += n_ready
+            data = data[:, n_ready * self.step:]
+        self._tail = data.copy()
+
+    def bad_channels(self):
+        """Channels with more than 5% of samples outside the amplitude thresholds"""
+        if self.n_samples == 0:
+            return []
+        bad = self._artifact_counts > self.n_samples * 0.05
+        return [ch for ch, is_bad in zip(self.ch_names, bad) if is_bad]
+
+    def psd(self):
+        """
+        Returns:
+        tuple: (PSD of shape (n_channels, n_freqs), freqs), or (None, freqs) before the first full segment
+        """
+        if self._n_segments == 0:
+            return None, self.freqs
+        return self._psd_sum / self._n_segments, self.freqs
+
+    def features(self):
+        """
+        Returns:
+        dict: Current ADHD features over all data seen so far, empty before the first full segment
+        """
+        psd, freqs = self.psd()
+        if psd is None:
+            return {}
+        bads = set(self.bad_channels())
+        good = [i for i, ch in enumerate(self.ch_names) if ch not in bads]
+        return features_from_psd(psd[good], freqs, [self.ch_names[i] for i in good])
@@ -5,6 +5,7 @@ db = db.getSiblingDB('eeg_database');
 db.createCollection('users');
 db.createCollection('eegdata');
 db.createCollection('datasharing');
+db.createCollection('eegchunks');
 
 // Create administrator account with maximum elevated permissions
 const adminExists = db.users.findOne({ email: "admin@eegility.com" });
@@ -139,6 +140,9 @@ db.eegdata.createIndex({ bidsCompliant: 1 });
 db.eegdata.createIndex({ isShared: 1 });
 db.eegdata.createIndex({ sharedWithUserIds: 1 });
 
+// Live recording chunk indexes (consumed in order by the EEG processor)
+db.eegchunks.createIndex({ eeg_id: 1, seq: 1 }, { unique: true });
+
 // Data sharing indexes
 db.datasharing.createIndex({ eegDataId: 1 });
 db.datasharing.createIndex({ sharedByUserId: 1 });